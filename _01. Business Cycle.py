@@ -1,14 +1,19 @@
 import os
 import pandas as pd
 import streamlit as st
-from helper import load_table, plot_datasets, plot_with_constant
+from helper import load_tables, plot_datasets, plot_with_constant
 
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
 # Load tables
 tables = ["ism", "nasdaq", "monthly_data", "quarterly_data", "crypto", "model_1", "model_2", "economic_data", "financial_conditions"]
-data = {name: load_table(name) for name in tables}
+# Only the columns the charts use from the wide monthly/quarterly tables
+columns = {
+    "monthly_data": ["Future Business Activity (Texas)", "Future New Orders (Philadelphia)", "US Composite Leading Indicator", "EU Business Confidence Survey"],
+    "quarterly_data": ["Private Residential Fixed Investment", "Real Gross Private Domestic Investment", "Net % Banks Tightening: Industrial"],
+}
+data = load_tables(tables, columns=columns)
 
 
 # Define start dates for charts
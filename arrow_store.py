@@ -0,0 +1,106 @@
+import glob
+import hashlib
+import logging
+import os
+import pandas as pd
+import pyarrow as pa
+import threading
+
+from loader import KEY
+
+
+# Tables are published as uncompressed Arrow IPC files, one per table and data version (the etl_watermarks
+# hash), that every Streamlit process memory-maps read-only. Numeric columns and the Date index are then
+# views over the shared page cache instead of per-process copies.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.getenv("ARROW_STORE_DIR", os.path.join(BASE_DIR, "data", "arrow"))
+ENABLED = os.getenv("ARROW_STORE", "1") == "1"
+
+_lock = threading.Lock()
+
+
+def _path(table_name, version):
+    tag = hashlib.sha256(str(version).encode()).hexdigest()[:16]
+    return os.path.join(STORE_DIR, table_name, f"{tag}.arrow")
+
+
+def _to_arrow(df):
+    # Float columns keep NaN as a value rather than a null, so reading them back needs no copy
+    index_name = df.index.name or KEY
+    arrays = [pa.array(pd.DatetimeIndex(df.index).as_unit("ns").to_numpy())]
+    for column in df.columns:
+        values = df[column]
+        if values.dtype.kind == "f":
+            arrays.append(pa.array(values.to_numpy(), from_pandas=False))
+        else:
+            arrays.append(pa.array(values, from_pandas=True))
+    table = pa.Table.from_arrays(arrays, names=[index_name] + [str(c) for c in df.columns])
+    return table.replace_schema_metadata({"index": index_name})
+
+
+def write(table_name, version, df):
+    # Writes the file for this version (then renames it into place) and removes the table's older versions.
+    # Processes still mapping an old file keep their pages until they drop it.
+    path = _path(table_name, version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = _to_arrow(df)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    with _lock:
+        os.replace(tmp, path)
+        for old in glob.glob(os.path.join(os.path.dirname(path), "*.arrow")):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+    return path
+
+
+def read(table_name, version):
+    # Frame backed by the memory-mapped file, or None if this version hasn't been published.
+    # The arrays are read-only: mutate a copy (the app runs with pandas copy-on-write, which does that lazily).
+    try:
+        source = pa.memory_map(_path(table_name, version), "r")
+    except FileNotFoundError:
+        return None
+    table = pa.ipc.open_file(source).read_all()
+    index_name = (table.schema.metadata or {}).get(b"index", KEY.encode()).decode()
+    df = table.to_pandas(split_blocks=True).set_index(index_name)
+    df.columns.name = None
+    return df
+
+
+def load(table_name, version, read_table):
+    # Maps the published file for version, publishing it first from read_table() if needed
+    if not ENABLED or version is None:
+        return read_table()
+    df = read(table_name, version)
+    if df is not None:
+        return df
+    df = read_table()
+    try:
+        write(table_name, version, df)
+    except (OSError, pa.ArrowException, TypeError, ValueError) as e:
+        logging.warning(f"Could not publish '{table_name}' to the Arrow store: {e}")
+        return df
+    return read(table_name, version)
+
+
+def publish(engine, catalog, tables):
+    # Called by the ETL after loading: writes the current version of each table from the database
+    published = []
+    for table_name in tables:
+        version = (catalog.get(table_name) or {}).get("content_hash")
+        if version is None:
+            continue
+        try:
+            df = pd.read_sql_table(table_name, con=engine, index_col=KEY, parse_dates=[KEY])
+            write(table_name, version, df)
+            published.append(table_name)
+        except Exception as e:
+            logging.warning(f"Could not publish '{table_name}' to the Arrow store: {e}")
+    logging.info(f"Published {len(published)} tables to the Arrow store at {STORE_DIR}.")
+    return published
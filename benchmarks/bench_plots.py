@@ -0,0 +1,94 @@
+import argparse
+import numpy as np
+import os
+import pandas as pd
+import plotly.graph_objects as go
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import helper
+from helper import basic_plot, plot_datasets
+
+# The undecorated helpers, so every iteration builds the figure instead of hitting (and filling) the figure cache
+build_basic = basic_plot.__wrapped__
+build_datasets = plot_datasets.__wrapped__
+
+
+# Compares figure payloads and render times of the plot helpers with LTTB downsampling against the
+# original traces ("raw": an SVG go.Scatter with every point, as the helpers drew them before).
+# Payload is the figure JSON Streamlit sends to the browser. Render time is a static export through
+# kaleido (a headless Chromium running plotly.js), so it's only measured if kaleido is installed, e.g.
+#   python benchmarks/bench_plots.py --sizes 3650 50000 500000
+
+
+def make_series(points, freq, seed=0):
+    # Random walk ending today, like a daily crypto price or an intraday series
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(end=pd.Timestamp.today().normalize(), periods=points, freq=freq, name="Date")
+    return pd.DataFrame({"Price": 100 * np.exp(np.cumsum(rng.normal(scale=0.01, size=points))),
+                         "Other": 50 * np.exp(np.cumsum(rng.normal(scale=0.01, size=points)))}, index=index)
+
+
+def baseline_scatter(series, name=None, max_points=None, **kwargs):
+    # The helpers' trace before downsampling: every point, always an SVG go.Scatter
+    return go.Scatter(x=series.index, y=series, name=name if name is not None else series.name, **kwargs)
+
+
+def build_with(trace_builder, build):
+    # Builds a figure with the helpers' traces made by trace_builder instead of helper.scatter
+    original = helper.scatter
+    helper.scatter = trace_builder
+    try:
+        return build()
+    finally:
+        helper.scatter = original
+
+
+def render_seconds(fig):
+    try:
+        import kaleido  # noqa: F401
+    except ImportError:
+        return None
+    start = time.perf_counter()
+    fig.to_image(format="png")
+    return time.perf_counter() - start
+
+
+def measure(build):
+    start = time.perf_counter()
+    fig = build()
+    payload = fig.to_json()
+    build_seconds = time.perf_counter() - start
+    points = sum(len(trace.x) for trace in fig.data)
+    kinds = ",".join(sorted({trace.type for trace in fig.data}))
+    return points, len(payload.encode()), build_seconds, render_seconds(fig), kinds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark plot payloads with and without downsampling.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3_650, 50_000, 500_000])
+    parser.add_argument("--max-points", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'points':>9} {'chart':>8} {'mode':>6} {'drawn':>8} {'payload':>10} {'build':>8} {'render':>8}  trace")
+    for size in args.sizes:
+        df = make_series(size, "D" if size <= 20_000 else "min")
+        start_date = df.index[0] - pd.Timedelta(days=1)
+        charts = {
+            "basic": lambda max_points: build_basic(df, "Price", start_date, max_points=max_points),
+            "dual": lambda max_points: build_datasets(df, df, "Price", "Other", start_date, max_points=max_points),
+        }
+        for chart, build in charts.items():
+            modes = {
+                "raw": lambda: build_with(baseline_scatter, lambda: build(None)),
+                "lttb": lambda: build(args.max_points),
+            }
+            for mode, build_mode in modes.items():
+                points, payload, build_seconds, render, kinds = measure(build_mode)
+                render = "n/a" if render is None else f"{render:.2f}s"
+                print(f"{size:>9,} {chart:>8} {mode:>6} {points:>8,} {payload / 1e6:>8.2f}MB {build_seconds:>7.2f}s {render:>8}  {kinds}")
+
+
+if __name__ == "__main__":
+    main()
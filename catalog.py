@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import pandas as pd
+
+from sqlalchemy import inspect, text
+
+
+# One row per ETL table, maintained by the loader in the same transaction as each write
+CATALOG_TABLE = "etl_watermarks"
+# Every entry update also sends NOTIFY on this channel (delivered at commit) with the table name as payload
+NOTIFY_CHANNEL = "etl_watermarks"
+
+CREATE_CATALOG = f"""
+CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+    table_name TEXT PRIMARY KEY,
+    last_date TIMESTAMP,
+    row_count BIGINT NOT NULL DEFAULT 0,
+    last_run_id TEXT,
+    content_hash TEXT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+)
+"""
+
+UPSERT_ENTRY = text(f"""
+INSERT INTO {CATALOG_TABLE} (table_name, last_date, row_count, last_run_id, content_hash, updated_at)
+VALUES (:table_name, :last_date, :row_count, :last_run_id, :content_hash, now())
+ON CONFLICT (table_name) DO UPDATE SET
+    last_date = EXCLUDED.last_date,
+    row_count = EXCLUDED.row_count,
+    last_run_id = EXCLUDED.last_run_id,
+    content_hash = EXCLUDED.content_hash,
+    updated_at = EXCLUDED.updated_at
+""")
+
+
+def ensure_catalog(conn):
+    conn.exec_driver_sql(CREATE_CATALOG)
+
+
+def _bootstrap(engine, tables):
+    # Seed entries for tables written before the catalog existed (one MAX/COUNT scan, first run only)
+    query = " UNION ALL ".join(
+        f'SELECT \'{t}\' AS table_name, MAX("Date") AS last_date, COUNT(*) AS row_count FROM "{t}"' for t in tables
+    )
+    seeded = {}
+    with engine.begin() as conn:
+        for row in conn.execute(text(query)).mappings():
+            entry = {
+                "table_name": row["table_name"],
+                "last_date": row["last_date"],
+                "row_count": int(row["row_count"]),
+                "last_run_id": None,
+                "content_hash": None,
+            }
+            conn.execute(UPSERT_ENTRY, entry)
+            seeded[row["table_name"]] = entry
+    logging.info(f"Seeded {CATALOG_TABLE} for {len(seeded)} existing tables.")
+    return seeded
+
+
+def read_catalog(engine, tables=()):
+    # Returns {table_name: entry} from a single catalog read at the start of a run.
+    # Existing tables missing from the catalog are seeded once from their own data.
+    with engine.begin() as conn:
+        ensure_catalog(conn)
+        rows = conn.execute(text(f"SELECT table_name, last_date, row_count, last_run_id, content_hash FROM {CATALOG_TABLE}"))
+        catalog = {row["table_name"]: dict(row) for row in rows.mappings()}
+    missing = [t for t in tables if t not in catalog]
+    if missing:
+        existing = set(inspect(engine).get_table_names())
+        missing = [t for t in missing if t in existing]
+        if missing:
+            catalog.update(_bootstrap(engine, missing))
+    return catalog
+
+
+def watermarks_from(catalog):
+    # {table_name: last stored Date} for the tables that have data
+    return {t: pd.Timestamp(e["last_date"]) for t, e in catalog.items() if e.get("last_date") is not None}
+
+
+def next_hash(previous, written_hash):
+    # Chains the hash of the rows just written onto the table's previous hash, so the value
+    # changes on every write that changes content and can serve as the table's data version
+    return hashlib.sha256(f"{previous or ''}:{written_hash}".encode()).hexdigest()
+
+
+def update_entry(conn, table_name, previous, written, inserted, run_id, written_hash, replace=False):
+    # Advances a table's catalog entry after a write; must run on the write's own connection
+    previous = previous or {}
+    last_date = written.index.max() if len(written) else None
+    prev_date = previous.get("last_date")
+    if not replace and prev_date is not None and (last_date is None or pd.Timestamp(prev_date) > last_date):
+        last_date = pd.Timestamp(prev_date)
+    entry = {
+        "table_name": table_name,
+        "last_date": None if last_date is None else pd.Timestamp(last_date).to_pydatetime(),
+        "row_count": inserted if replace else int(previous.get("row_count") or 0) + inserted,
+        "last_run_id": run_id,
+        "content_hash": written_hash if replace else next_hash(previous.get("content_hash"), written_hash),
+    }
+    ensure_catalog(conn)
+    conn.execute(UPSERT_ENTRY, entry)
+    conn.execute(text("SELECT pg_notify(:channel, :table_name)"), {"channel": NOTIFY_CHANNEL, "table_name": table_name})
+    return entry
@@ -0,0 +1,90 @@
+import asyncio
+import deadlines
+import metrics
+import os
+import pandas as pd
+import requests
+
+from datetime import datetime, timezone
+from ratelimit import TokenBucket
+
+
+# CoinGecko ids for the tokens stored in the crypto table (column name -> coin id)
+COINS = {
+    "BTC": "bitcoin",
+    "ETH": "ethereum",
+    "SOL": "solana",
+    "SUI": "sui",
+}
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3")
+# The public API allows roughly 30 calls per minute
+COINGECKO_REQUESTS_PER_MINUTE = int(os.getenv("COINGECKO_REQUESTS_PER_MINUTE", "30"))
+# Ranges longer than 90 days come back as daily points, so backfills are requested a year at a time
+CHUNK_DAYS = int(os.getenv("COINGECKO_CHUNK_DAYS", "365"))
+# Earliest date requested when backfilling a token with no stored history
+BACKFILL_START = pd.Timestamp(os.getenv("COINGECKO_BACKFILL_START", "2013-04-28"))
+
+
+def _unix(ts):
+    ts = pd.Timestamp(ts)
+    return int(datetime(ts.year, ts.month, ts.day, tzinfo=timezone.utc).timestamp())
+
+
+def chunk_ranges(start, end, days=CHUNK_DAYS):
+    # Splits [start, end) into consecutive windows of at most `days` days
+    start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+    step = pd.Timedelta(days=days)
+    ranges = []
+    while start < end:
+        ranges.append((start, min(start + step, end)))
+        start = start + step
+    return ranges
+
+
+class CoinGeckoFetcher:
+    # Fetches market_chart/range price history for several tokens concurrently under one token bucket
+    def __init__(self, base_url=COINGECKO_API_URL, requests_per_minute=COINGECKO_REQUESTS_PER_MINUTE,
+                 chunk_days=CHUNK_DAYS, timeout=30, session=None):
+        self.base_url = base_url.rstrip("/")
+        self.bucket = TokenBucket(rate=requests_per_minute / 60, capacity=5)
+        self.chunk_days = chunk_days
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.requests_made = 0
+
+    async def _fetch_chunk(self, token, start, end):
+        metrics.add_time("throttle", await self.bucket.acquire_async())
+        url = f"{self.base_url}/coins/{COINS[token]}/market_chart/range"
+        params = {"vs_currency": "usd", "from": _unix(start), "to": _unix(end)}
+        timeout = deadlines.timeout(self.timeout)
+        # requests is blocking, so each call runs on a worker thread while the loop schedules the rest
+        with metrics.timed("download"):
+            response = await asyncio.to_thread(self.session.get, url, params=params, timeout=timeout)
+        self.requests_made += 1
+        metrics.record_response(response)
+        if response.status_code != 200:
+            # A missing chunk would leave a hole behind the crypto watermark that later runs never refetch,
+            # so it fails the whole fetch and the next run requests the same ranges again
+            raise requests.HTTPError(f"Error downloading data for {token} ({start:%Y-%m-%d} to {end:%Y-%m-%d}): "
+                                     f"{response.status_code}", response=response)
+        return response.json().get("prices", [])
+
+    async def _fetch_token(self, token, start, end):
+        chunks = chunk_ranges(start, end, self.chunk_days)
+        results = await asyncio.gather(*(self._fetch_chunk(token, s, e) for s, e in chunks))
+        prices = [point for chunk in results for point in chunk]
+        series = pd.Series([p[1] for p in prices], index=pd.to_datetime([p[0] for p in prices], unit="ms"), name=token, dtype="float64")
+        # Short ranges come back hourly; keep one point per day (the first, i.e. 00:00 UTC) like the daily data
+        series = series[~series.index.duplicated(keep="first")].sort_index()
+        return series.resample("D").first().dropna()
+
+    async def fetch_async(self, starts, end):
+        # starts maps token -> first date wanted; every token and chunk is requested concurrently
+        tokens = list(starts)
+        series = await asyncio.gather(*(self._fetch_token(t, starts[t], end) for t in tokens))
+        df = pd.concat(dict(zip(tokens, series)), axis=1, join="outer") if tokens else pd.DataFrame()
+        df.index.name = "Date"
+        return df
+
+    def fetch(self, starts, end):
+        return asyncio.run(self.fetch_async(starts, end))
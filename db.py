@@ -0,0 +1,186 @@
+import arrow_store
+import boto3, json, logging, os
+import pandas as pd
+import select
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from loader import KEY, quote
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from table_cache import TableCache
+
+# Secrets are cached for SECRET_TTL seconds; after that the secret is re-read and the engine rebuilt
+# if the credentials rotated. One engine (and connection pool) per secret is shared by every
+# Streamlit session thread, so the pool is sized for several sessions loading tables at once.
+SECRET_TTL = int(os.getenv("DB_SECRET_TTL_SECONDS", "3600"))
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+# Table frames are cached per process and revalidated against etl_watermarks at most every
+# DB_CACHE_POLL_SECONDS; DB_CACHE_LISTEN=1 also LISTENs for the ETL's commits to invalidate immediately
+CACHE_POLL_SECONDS = float(os.getenv("DB_CACHE_POLL_SECONDS", "5"))
+CACHE_TTL_SECONDS = float(os.getenv("DB_CACHE_TTL_SECONDS", "300"))
+CACHE_LISTEN = os.getenv("DB_CACHE_LISTEN", "0") == "1"
+READER_SECRET = "etl_readonly_pw"
+
+_lock = threading.Lock()
+_clients = {}
+_secrets = {}
+_secret_locks = {}
+_engines = {}
+
+# Load SQL database
+def get_secret(secret_name, region_name="us-west-2", refresh=False):
+    # Cached per secret name; refresh=True bypasses the cache (e.g. after a failed login).
+    # Concurrent misses for the same secret wait for a single fetch.
+    with _lock:
+        secret_lock = _secret_locks.setdefault(secret_name, threading.Lock())
+    requested = time.monotonic()
+    with secret_lock:
+        cached = _secrets.get(secret_name)
+        # A refresh that another thread completed while we waited counts as ours
+        if cached and cached[0] > time.monotonic() and (not refresh or cached[1] > requested):
+            return cached[2]
+        with _lock:
+            if region_name not in _clients:
+                _clients[region_name] = boto3.client("secretsmanager", region_name=region_name)
+            client = _clients[region_name]
+        resp = client.get_secret_value(SecretId=secret_name)
+        secret = json.loads(resp["SecretString"])
+        fetched = time.monotonic()
+        _secrets[secret_name] = (fetched + SECRET_TTL, fetched, secret)
+    return secret
+
+def _engine_url(creds):
+    return f"postgresql://{creds['DB_USER']}:{creds['DB_PASS']}@{creds['DB_HOST']}:{creds['DB_PORT']}/{creds['DB_NAME']}"
+
+def get_engine(user_secret, refresh=False):
+    # Returns the shared engine for a secret, rebuilding it only when the credentials change
+    creds = get_secret(user_secret, refresh=refresh)
+    url = _engine_url(creds)
+    with _lock:
+        cached = _engines.get(user_secret)
+        if cached and cached[0] == url:
+            return cached[1]
+        engine = create_engine(url, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_pre_ping=True, pool_recycle=POOL_RECYCLE)
+        _engines[user_secret] = (url, engine)
+    if cached:
+        # Credentials rotated: close the old pool's idle connections, checked-out ones finish normally
+        cached[1].dispose()
+    return engine
+
+def _is_auth_error(e):
+    return "password authentication failed" in str(e) or "no pg_hba.conf entry" in str(e)
+
+def run_with_engine(user_secret, func):
+    # Calls func(engine); a failed login means the secret rotated before its TTL, so re-read it and retry once
+    try:
+        return func(get_engine(user_secret))
+    except OperationalError as e:
+        if not _is_auth_error(e):
+            raise
+        return func(get_engine(user_secret, refresh=True))
+
+def _read_table(table_name, columns=None, start=None, end=None):
+    # One parameterized SELECT of the requested columns between start and end (inclusive), so
+    # columns and rows the page doesn't use are never transferred or converted
+    if columns is None and start is None and end is None:
+        # Whole tables come from the shared Arrow store, mapped from the file for the current version
+        read = lambda: run_with_engine(READER_SECRET, lambda engine: pd.read_sql_table(table_name, con=engine, index_col=KEY, parse_dates=[KEY]))
+        return arrow_store.load(table_name, table_cache.versions().get(table_name), read)
+    select_list = "*" if columns is None else ", ".join(quote(c) for c in (KEY,) + tuple(columns))
+    conditions = []
+    params = {}
+    if start is not None:
+        conditions.append(f"{quote(KEY)} >= :start")
+        params["start"] = pd.Timestamp(start).to_pydatetime()
+    if end is not None:
+        conditions.append(f"{quote(KEY)} <= :end")
+        params["end"] = pd.Timestamp(end).to_pydatetime()
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = text(f"SELECT {select_list} FROM {quote(table_name)}{where} ORDER BY {quote(KEY)}")
+    def read(engine):
+        with engine.connect() as conn:
+            return pd.read_sql(query, conn, params=params, index_col=KEY, parse_dates=[KEY])
+    return run_with_engine(READER_SECRET, read)
+
+def _read_versions():
+    # Data version of every ETL table: the chained content hash the loader advances on each write
+    query = text("SELECT table_name, COALESCE(content_hash, last_run_id, CAST(last_date AS TEXT)) AS version FROM etl_watermarks")
+    def read(engine):
+        with engine.connect() as conn:
+            return {row.table_name: row.version for row in conn.execute(query)}
+    return run_with_engine(READER_SECRET, read)
+
+table_cache = TableCache(_read_table, _read_versions, poll_seconds=CACHE_POLL_SECONDS, ttl=CACHE_TTL_SECONDS)
+_listener = None
+
+def _listen():
+    # Holds one connection that LISTENs on the catalog channel; each NOTIFY makes the next read re-poll versions
+    while True:
+        try:
+            conn = get_engine(READER_SECRET).raw_connection()
+            try:
+                conn.driver_connection.autocommit = True
+                conn.cursor().execute("LISTEN etl_watermarks")
+                pg = conn.driver_connection
+                while True:
+                    if select.select([pg], [], [], 60) != ([], [], []):
+                        pg.poll()
+                        while pg.notifies:
+                            pg.notifies.pop(0)
+                            table_cache.invalidate()
+            finally:
+                conn.invalidate()
+        except Exception as e:
+            logging.warning(f"Lost the etl_watermarks listener, retrying in 30s: {e}")
+            time.sleep(30)
+
+def _start_listener():
+    global _listener
+    with _lock:
+        if _listener is None:
+            _listener = threading.Thread(target=_listen, name="etl-watermarks-listener", daemon=True)
+            _listener.start()
+
+def load_table(table_name, columns=None, start=None, end=None):
+    # Loads a table from the database, served from the process-wide cache while its version is unchanged.
+    # columns limits the read to those columns (the Date index always comes along) and start/end to
+    # that date range, both applied in the SQL query.
+    if CACHE_LISTEN:
+        _start_listener()
+    query = {}
+    if columns is not None:
+        query["columns"] = tuple([columns] if isinstance(columns, str) else columns)
+    if start is not None:
+        query["start"] = pd.Timestamp(start)
+    if end is not None:
+        query["end"] = pd.Timestamp(end)
+    return table_cache.get(table_name, **query)
+
+def load_watermarks():
+    # Reads the ETL's etl_watermarks catalog (last date, row count, last run per table) to show data freshness
+    return run_with_engine(READER_SECRET, lambda engine: pd.read_sql_table("etl_watermarks", con=engine, index_col="table_name", parse_dates=["last_date", "updated_at"]))
+
+def load_tables(names, max_workers=None, timings=None, columns=None, start=None, end=None):
+    # Loads several tables concurrently over the shared pool and returns {name: DataFrame} in the order given.
+    # Per-table load times are logged and, if a dict is passed as timings, recorded in it.
+    # columns, start and end are {table: value} dicts passed on to load_table for those tables.
+    names = list(dict.fromkeys(names))
+    columns, start, end = columns or {}, start or {}, end or {}
+    def timed_load(name):
+        started = time.perf_counter()
+        df = load_table(name, columns=columns.get(name), start=start.get(name), end=end.get(name))
+        return df, time.perf_counter() - started
+    load_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers or min(POOL_SIZE, max(1, len(names)))) as pool:
+        loaded = dict(zip(names, pool.map(timed_load, names)))
+    data = {name: df for name, (df, _) in loaded.items()}
+    seconds = {name: elapsed for name, (_, elapsed) in loaded.items()}
+    if timings is not None:
+        timings.update(seconds)
+    logging.info(f"Loaded {len(names)} tables in {time.perf_counter() - load_start:.2f}s ("
+                 + ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in seconds.items()) + ")")
+    return data
@@ -0,0 +1,59 @@
+import os
+import time
+
+from contextvars import ContextVar
+
+
+# Time budgets for source tasks. The scheduler binds a Deadline to each task; the HTTP clients check
+# it before every request and cap their timeouts to the time left, so one hanging host can't stall a run.
+REQUEST_TIMEOUT = float(os.getenv("ETL_REQUEST_TIMEOUT", "30"))
+# Never hand a request less than this, or it fails before the connection is even made
+MIN_REQUEST_TIMEOUT = 1.0
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    # An absolute point on the monotonic clock
+    def __init__(self, seconds=None, at=None):
+        self.at = at if at is not None else time.monotonic() + seconds
+
+    def remaining(self):
+        return self.at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+_current = ContextVar("etl_deadline", default=None)
+
+
+def current():
+    return _current.get()
+
+
+def bind(deadline):
+    return _current.set(deadline)
+
+
+def unbind(token):
+    _current.reset(token)
+
+
+def check():
+    # Raises DeadlineExceeded once the current task's budget is used up
+    deadline = _current.get()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded("source time budget exhausted")
+
+
+def timeout(default=REQUEST_TIMEOUT):
+    # Timeout for the next request: the default, shortened to whatever is left of the current budget
+    default = REQUEST_TIMEOUT if default is None else default
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    check()
+    return max(MIN_REQUEST_TIMEOUT, min(default, deadline.remaining()))
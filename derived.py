@@ -0,0 +1,153 @@
+import logging
+import pandas as pd
+import time
+
+from dataclasses import dataclass
+from loader import quote, read_window, write_tables
+from typing import Callable
+
+
+@dataclass
+class Derived:
+    # A table computed from other tables after they are loaded: func(inputs) takes {table_name: DataFrame}
+    # and returns the derived columns. warmup is how much history before the first changed row the
+    # computation needs (YoY% lookbacks, diffs, rolling windows, the start of a resample bucket).
+    name: str
+    func: Callable
+    inputs: tuple = ()
+    warmup: pd.DateOffset = None
+
+
+# Registered derived tables, kept in declaration order
+DERIVED = {}
+
+
+def derived(name, inputs, warmup=None):
+    # Decorator that registers a function as a derived table
+    if isinstance(inputs, str):
+        inputs = (inputs,)
+    def register(func):
+        DERIVED[name] = Derived(name=name, func=func, inputs=tuple(inputs), warmup=warmup)
+        return func
+    return register
+
+
+@derived("crypto_ratios", inputs="crypto")
+def crypto_ratios(data):
+    crypto = data["crypto"]
+    ratios = pd.DataFrame(index=crypto.index)
+    ratios["ETH/BTC"] = crypto["ETH"] / crypto["BTC"]
+    ratios["SOL/BTC"] = crypto["SOL"] / crypto["BTC"]
+    ratios["SOL/ETH"] = crypto["SOL"] / crypto["ETH"]
+    ratios["SUI/SOL"] = crypto["SUI"] / crypto["SOL"]
+    return ratios
+
+
+@derived("inflation_yoy", inputs="inflation", warmup=pd.DateOffset(months=14))
+def inflation_yoy(data):
+    inflation = data["inflation"]
+    yoy = pd.DataFrame(index=inflation.index)
+    yoy["CPI YoY%"] = inflation["Consumer Price Index"].pct_change(periods=12) * 100
+    yoy["PPI YoY%"] = inflation["Producer Price Index"].pct_change(periods=12, fill_method=None) * 100
+    return yoy
+
+
+@derived("banking_yoy", inputs="banking", warmup=pd.DateOffset(months=14))
+def banking_yoy(data):
+    banking = data["banking"]
+    yoy = pd.DataFrame(index=banking.index)
+    for col in banking.columns:
+        yoy[col + " YoY%"] = banking[col].pct_change(periods=12, fill_method=None) * 100
+    return yoy
+
+
+@derived("global_m2_yoy", inputs="global_m2", warmup=pd.DateOffset(weeks=60))
+def global_m2_yoy(data):
+    global_m2 = data["global_m2"]
+    yoy = pd.DataFrame(index=global_m2.index)
+    yoy["Global M2 YoY%"] = global_m2["Global M2"].pct_change(periods=52, fill_method=None) * 100
+    return yoy
+
+
+@derived("fed_liquidity_yoy", inputs="fed_liquidity", warmup=pd.DateOffset(weeks=60))
+def fed_liquidity_yoy(data):
+    fed_liquidity = data["fed_liquidity"]
+    yoy = pd.DataFrame(index=fed_liquidity.index)
+    yoy["Fed Liquidity YoY%"] = fed_liquidity["Fed Net Liquidity"].pct_change(periods=52) * 100
+    return yoy
+
+
+@derived("domestic_liquidity", inputs=("fed_liquidity", "monthly_data"), warmup=pd.DateOffset(months=14))
+def domestic_liquidity(data):
+    # Weekly Fed Net Liquidity averaged per month, plus M2
+    fed = data["fed_liquidity"][["Fed Net Liquidity"]].resample("ME").mean()
+    fed["M2"] = data["monthly_data"]["US M2"]
+    fed["Total Liquidity"] = fed["M2"] + fed["Fed Net Liquidity"]
+    fed["Liquidity YoY%"] = fed["Total Liquidity"].pct_change(periods=12, fill_method=None) * 100
+    return fed
+
+
+@derived("credit_impulse", inputs="quarterly_data", warmup=pd.DateOffset(months=36))
+def credit_impulse(data):
+    quarterly = data["quarterly_data"]
+    credit = pd.DataFrame(index=quarterly.index)
+    # Change in private credit over a year, and the credit impulse (change in the 6 month flow) as % of GDP
+    credit["Change in Credit"] = quarterly["Total Private Credit"].diff(4)
+    credit["Credit Change % GDP"] = (credit["Change in Credit"] / quarterly["US GDP"]) * 100
+    credit["6 Month Credit Change"] = quarterly["Total Private Credit"].diff(2)
+    credit["6 Month Flow Change"] = credit["6 Month Credit Change"].diff(2)
+    credit["Credit Impulse/GDP"] = (credit["6 Month Flow Change"] / quarterly["US GDP"]) * 100
+    credit["Credit Impulse Smoothed"] = credit["Credit Impulse/GDP"].rolling(window=6, center=False).mean()
+    # Same for mortgages (debt converted to billions)
+    mortgage_change = (quarterly["Total Mortgage Debt"] / 1000).diff(2)
+    credit["Mortgage Credit Impulse/GDP"] = (mortgage_change.diff(3) / quarterly["US GDP"]) * 100
+    credit["Mortgage Credit Impulse Smoothed"] = credit["Mortgage Credit Impulse/GDP"].rolling(window=4, center=False).mean()
+    return credit
+
+
+def _read_input(table_name, conn, start):
+    # Full table, or the stored rows from start
+    if start is None:
+        return pd.read_sql(f"SELECT * FROM {quote(table_name)}", conn, index_col="Date", parse_dates=["Date"]).sort_index()
+    return read_window(table_name, conn, start).sort_index()
+
+
+def update_derived(engine, catalog, load_stats, run_id=None, initial=False, tables=None, deadline=None):
+    # Recomputes the derived tables whose inputs were written in this run, and builds any not stored yet. Only the window from the
+    # earliest changed input row onwards is recomputed (read back from the database with each table's
+    # warmup) and the loader's diff writes just the rows that moved. Returns the loader stats.
+    # tables limits the run to some derived tables; new or --initial tables are computed in full.
+    frames = {}
+    for spec in DERIVED.values():
+        if tables is not None and spec.name not in tables:
+            continue
+        changed = [load_stats[t].get("changed_from") for t in spec.inputs if t in load_stats]
+        changed = [pd.Timestamp(c) for c in changed if c is not None]
+        # A table that was never built is computed in full even if its inputs didn't change this run
+        full = initial or spec.name not in catalog
+        if not changed and not full:
+            continue
+        missing = [t for t in spec.inputs if t not in catalog]
+        if missing:
+            logging.warning(f"Not updating '{spec.name}', inputs not loaded yet: {', '.join(missing)}")
+            continue
+        start = None if full else min(changed)
+        read_from = start if start is None or spec.warmup is None else start - spec.warmup
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                inputs = {t: _read_input(t, conn, read_from) for t in spec.inputs}
+            df = spec.func(inputs)
+        except Exception as e:
+            logging.error(f"Failed to compute '{spec.name}': {e}")
+            continue
+        if start is not None:
+            df = df[df.index >= start]
+            df.attrs["diff_start"] = start
+        df.index.name = "Date"
+        frames[spec.name] = df
+        logging.info(f"Computed '{spec.name}' from {'full history' if start is None else f'{start:%Y-%m-%d}'} "
+                     f"({len(df)} rows) in {time.perf_counter() - started:.2f}s.")
+    if not frames:
+        return {}
+    return write_tables(frames, engine, catalog=catalog, run_id=run_id, initial=initial, deadline=deadline)
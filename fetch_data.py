@@ -1,17 +1,23 @@
 import argparse
+import deadlines
+import json
 import logging
+import metrics
 import os
 import pandas as pd
-import requests
 import time
-import yfinance as yf
-import xml.etree.ElementTree as ET
 
+from catalog import read_catalog, watermarks_from
 from datetime import date as dt_date, datetime, timezone
+from derived import DERIVED, update_derived
 from dotenv import load_dotenv
-from fredapi import Fred
-from helper import get_engine, load_table
-from io import BytesIO
+from fred_client import FredClient
+from db import get_engine
+from http_cache import HttpCache
+from loader import write_tables
+from pipeline import HOST_LIMITS, RunContext, new_run_id, run_sources, select_sources, source, source_tables
+from sqlalchemy import inspect
+from transforms import splice
 
 
 # Add logging config
@@ -28,205 +34,146 @@ logging.basicConfig(
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 data_path = os.path.join(BASE_DIR, "data", "historical_data.xlsx")
 
-
-def run_etl(initial=False, debug=False):
-    # Define the SQL engine
-    engine = get_engine("etl_writer_pw")
-    # Create an empty dictionary
-    all_data = {}
-    # Define today's date
-    today = dt_date.today()
-
-    # Fed Liquidity Data
-    load_dotenv()
-    FRED_API_KEY = os.getenv("FRED_API_KEY")
-    # Initialize FRED API
-    fred = Fred(api_key=FRED_API_KEY)
+# Under a deadline, up to this much of the remaining time is kept for loading, and loading
+# stops this long before the deadline itself
+LOAD_RESERVE_SECONDS = float(os.getenv("ETL_LOAD_RESERVE_SECONDS", "90"))
+DEADLINE_MARGIN_SECONDS = float(os.getenv("ETL_DEADLINE_MARGIN_SECONDS", "10"))
+# Where the ETL runs on the app's host, ETL_PREBUILD_FIGURES=1 rebuilds every page's figures into the
+# shared figure cache after new data is written, so visitors don't pay for it
+PREBUILD_FIGURES = os.getenv("ETL_PREBUILD_FIGURES", "0") == "1"
+# Likewise ETL_PUBLISH_ARROW=1 writes each updated table to the app's shared Arrow store (arrow_store.py)
+PUBLISH_ARROW = os.getenv("ETL_PUBLISH_ARROW", "0") == "1"
+# Run the ISM prediction stage (predictions.py) after loading; it only refits when its inputs changed
+RUN_PREDICTIONS = os.getenv("ETL_RUN_PREDICTIONS", "0") == "1"
+
+
+# Fed Liquidity Data
+@source("Liquidity", hosts="fred", tables="fed_liquidity", priority=1)
+def fetch_liquidity(ctx):
+    fred = ctx.fred
     # List of economic indicators to fetch
     liquidity_dict = {
         "Fed Balance Sheet": "WALCL",
         "TGA": "WTREGEN",
         "RRP": "RRPONTSYD"}
-    # Loop through series and fetch data
-    try:
-        liquidity_df = pd.DataFrame()
-        for series_name, series_id in liquidity_dict.items():
-            liquidity_df[series_name] = fred.get_series(series_id)
-        liquidity_df.index.name = "Date"
-        # Handle Missing Values
-        liquidity_df['RRP'] = liquidity_df['RRP'].fillna(0)
-        if liquidity_df.iloc[-1].isnull().any():
-            liquidity_df = liquidity_df.iloc[:-1]
-        # Change units of Fed Balance Sheet so everything is in billions
-        liquidity_df["Fed Balance Sheet"] = liquidity_df["Fed Balance Sheet"]/1000
-        # Calculate Fed Net Liquidity Column
-        liquidity_df["Fed Net Liquidity"] = liquidity_df["Fed Balance Sheet"] - liquidity_df["TGA"] - liquidity_df["RRP"]
-        all_data["fed_liquidity"] = liquidity_df
-        logging.info("Liquidity data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Liquidity data: {e}")
-
-
-    # Nasdaq Composite Index
-    nasdaq_df = pd.DataFrame()
-    try:
-        nasdaq_df["Nasdaq"] = fred.get_series("NASDAQCOM")
-        nasdaq_df.index.name = "Date"
-        nasdaq_df = nasdaq_df.dropna()
-        # Convert to weekly data
-        nasdaq_df = nasdaq_df.resample("W-FRI").last()
-        # Add column for YoY% changes
-        nasdaq_df["Nasdaq YoY%"] = nasdaq_df["Nasdaq"].pct_change(periods=52) * 100
-        # Drop missing values again
-        nasdaq_df = nasdaq_df.dropna()
-        all_data["nasdaq"] = nasdaq_df
-        logging.info("Nasdaq data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Nasdaq data: {e}")
-
-
-    # Gold Spot Price
+    # Fetch all series in one batch
+    liquidity_df = fred.get_many(liquidity_dict, observation_start=ctx.observation_start("fed_liquidity"))
+    # Handle Missing Values
+    liquidity_df['RRP'] = liquidity_df['RRP'].fillna(0)
+    if not liquidity_df.empty and liquidity_df.iloc[-1].isnull().any():
+        liquidity_df = liquidity_df.iloc[:-1]
+    # Change units of Fed Balance Sheet so everything is in billions
+    liquidity_df["Fed Balance Sheet"] = liquidity_df["Fed Balance Sheet"]/1000
+    # Calculate Fed Net Liquidity Column
+    liquidity_df["Fed Net Liquidity"] = liquidity_df["Fed Balance Sheet"] - liquidity_df["TGA"] - liquidity_df["RRP"]
+    return {"fed_liquidity": liquidity_df}
+
+
+# Nasdaq Composite Index
+@source("Nasdaq", hosts="fred", tables="nasdaq", priority=1)
+def fetch_nasdaq(ctx):
+    # Incremental runs need an extra year of history for the YoY% column
+    start = ctx.observation_start("nasdaq", warmup=pd.DateOffset(weeks=53))
+    nasdaq_df = ctx.fred.get_many({"Nasdaq": "NASDAQCOM"}, observation_start=start)
+    nasdaq_df = nasdaq_df.dropna()
+    # Convert to weekly data
+    nasdaq_df = nasdaq_df.resample("W-FRI").last()
+    # Add column for YoY% changes
+    nasdaq_df["Nasdaq YoY%"] = nasdaq_df["Nasdaq"].pct_change(periods=52) * 100
+    # Drop missing values again
+    nasdaq_df = nasdaq_df.dropna()
+    return {"nasdaq": nasdaq_df}
+
+
+# Gold Spot Price
+def parse_gold_spot(file):
+    gold_file = pd.read_excel(file)
+    gold_spot = gold_file[["USD/Gold", "Unnamed: 5"]]
+    gold_spot = gold_spot.rename(columns={"USD/Gold": "Date", "Unnamed: 5": "Gold Price"})
+    gold_spot = gold_spot.set_index("Date")
+    gold_spot = gold_spot.resample("W").mean()
+    return gold_spot
+
+
+# GLD Price from Yahoo Finance, only used to extend the gold spot series
+@source("GLD", hosts="yahoo", tables="gld", load=False)
+def fetch_gld(ctx):
+    # Heavy per-source libraries are imported inside their source so the Lambda cold start doesn't pay for them
+    import yfinance as yf
+    with metrics.timed("download"):
+        gld = yf.download("GLD", start="2004-01-01", end=ctx.today, auto_adjust=True, progress=False, timeout=deadlines.timeout())
+    gld = gld["Close"]
+    # Resample to weekly to match the spot series
+    return {"gld": gld.resample("W").mean()}
+
+
+@source("Gold", hosts="auronum", tables="gold", depends="GLD")
+def fetch_gold(ctx):
     gold_url = "https://auronum.co.uk/wp-content/uploads/2024/09/Auronum-Historic-Gold-Price-Data-5.xlsx"
     headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"}
-    try:
-        response = requests.get(gold_url, headers=headers)
-        response.raise_for_status()  # Raises a 403 or other HTTPError if one occurs
-        gold_file = pd.read_excel(BytesIO(response.content))
-        gold_spot = gold_file[["USD/Gold", "Unnamed: 5"]]
-        gold_spot = gold_spot.rename(columns={"USD/Gold": "Date", "Unnamed: 5": "Gold Price"})
-        gold_spot = gold_spot.set_index("Date")
-        gold_spot = gold_spot.resample("W").mean()
-        # Yahoo Finance for GLD Price
-        gld = yf.download("GLD", start="2004-01-01", end=today, auto_adjust=True, progress=False)
-        gld = gld["Close"]
-        # Resample to monthly and calculate weekly return
-        gld = gld.resample("W").mean()
-        gld["Weekly Return"] = gld["GLD"].pct_change()
-        # Extend the spot price based on GLD returns to-date
-        # Find the last known value of Gold Spot Price
-        last_spot_price = gold_spot['Gold Price'].iloc[-1]
-        # Create a new DataFrame to store the extended prices
-        extended_gold = gold_spot.copy()
-        for date, row in gld.loc[gold_spot.index[-1]:].iterrows():
-            # If the date is already in the spot price data, skip it
-            if date in extended_gold.index:
-                continue
-            # Calculate the next week's spot price based on the previous spot price and GLD weekly return
-            weekly_return = row['Weekly Return']
-            last_spot_price = last_spot_price * (1 + weekly_return)
-            # Append the calculated spot price to the extended dataframe
-            extended_gold.loc[date] = last_spot_price
-        # Sort the extended DataFrame by date
-        extended_gold = extended_gold.sort_index()
-        # Add to dictionary
-        all_data["gold"] = extended_gold
-        logging.info("Gold data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Gold data: {e}")
-
-
-    # Dollar Reserves (IMF)
+    # The workbook only changes occasionally, so it is revalidated rather than re-downloaded
+    gold_spot = ctx.http_cache.fetch_frame(gold_url, parse_gold_spot, headers=headers)
+    gld = ctx.upstream("gld")
+    # Extend the spot price to-date by compounding GLD's weekly returns from the last known spot price
+    extended_gold = splice(gold_spot["Gold Price"], gld["GLD"]).to_frame()
+    return {"gold": extended_gold}
+
+
+# Dollar Reserves (IMF)
+@source("Dollar Reserves", hosts="imf", tables="dollar_reserves", priority=3, cost=20)
+def fetch_dollar_reserves(ctx):
     imf_url = "https://api.imf.org/external/sdmx/3.0/data/dataflow/IMF.STA/COFER/%2B/G001.AFXRA.CI_USD.SHRO_PT.Q?dimensionAtObservation=TIME_PERIOD&attributes=dsd&measures=all&includeHistory=false"
-    dollar_reserves = None
-    # Fetch the data
-    response = requests.get(imf_url)
-    # Check for successful response
-    if response.status_code == 200:
-        imf_data = response.json()
-        # Grab the values from the response
-        values_dict = imf_data["data"]["dataSets"][0]["series"]["0:0:0:0:0"]["observations"]
-        values = []
-        for k, l in values_dict.items():
-            values.append(float(l[0]))
-        # Grab the dates
-        quarters = []
-        quarter_list = imf_data["data"]["structures"][0]["dimensions"]["observation"][0]["values"]
-        for i in range(len(quarter_list)):
-            quarters.append(quarter_list[i]["value"])
-        # Convert to quarter end dates
-        dates = [pd.Period(q, freq='Q').end_time.normalize() for q in quarters]
-        # Create dataframe
-        dollar_reserves = pd.DataFrame(data={"Dollar % Reserves": values}, index=dates)
-        dollar_reserves.index.name = "Date"
-    else:
-        logging.error(f"Failed to retrieve data: {response.status_code}")
-    # Add to dictionary
-    if dollar_reserves is not None:
-        all_data["dollar_reserves"] = dollar_reserves
-        logging.info("Dollar Reserves data fetched.")
-        
-        
-    # International Debt Securities (BIS)
+    # Decode the SDMX-JSON observations into quarter-end dates
+    from sdmx import fetch_sdmx_json
+    dollar_reserves = fetch_sdmx_json(imf_url, freq="Q", name="Dollar % Reserves", series_key="0:0:0:0:0").to_frame()
+    return {"dollar_reserves": dollar_reserves}
+
+
+# International Debt Securities (BIS)
+@source("Debt Securities", hosts="bis", tables="debt_securities", priority=3, cost=30)
+def fetch_debt_securities(ctx):
     urls = {} # Create dict for urls
     urls["Total"] = "https://stats.bis.org/api/v1/data/WS_DEBT_SEC2_PUB/Q.3P.3P.1.1.C.A.A.TO1.A.A.A.A.A.I/all?startPeriod=1967"
     urls["USD"] = "https://stats.bis.org/api/v1/data/WS_DEBT_SEC2_PUB/Q.3P.3P.1.1.C.A.A.USD.A.A.A.A.A.I/all?startPeriod=1967"
-    ns = {'message': 'http://www.sdmx.org/resources/sdmxml/schemas/v2_1/message'}
-    # Create empty dataframe
-    debt_securities = pd.DataFrame()
-    # Loop through the urls
-    try:
-        for type, url in urls.items():
-            # Make the request
-            response = requests.get(url)
-            root = ET.fromstring(response.content)
-            dataset = root.find('message:DataSet', ns)
-            # Extract observations from the XML tree
-            debt_data = []
-            # Loop through all <Series> elements
-            for series in dataset.findall('Series'):
-                # Loop through all <Obs> entries
-                for obs in series.findall('Obs'):
-                    tp = obs.attrib.get('TIME_PERIOD')
-                    value = obs.attrib.get('OBS_VALUE')
-                    if value is not None:
-                        debt_data.append({
-                            'Time': tp,
-                            'Value': float(value),})
-            # Convert to DataFrame
-            temp_df = pd.DataFrame(debt_data)
-            temp_df.columns = ["Date", f"{type} Debt"]
-            # Merge on 'Date'
-            if debt_securities.empty:
-                debt_securities = temp_df
-            else:
-                debt_securities = pd.merge(debt_securities, temp_df, on='Date', how='outer')
-        # Fix dates & convert to billions
-        debt_securities["Date"] = pd.PeriodIndex(debt_securities["Date"], freq="Q").to_timestamp(how="end").normalize()
-        debt_securities = debt_securities.set_index("Date")
-        debt_securities = debt_securities / 1000
-        # Add to dictionary
-        if not debt_securities.empty:
-            all_data["debt_securities"] = debt_securities
-            logging.info("Debt Securities data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Debt Security data: {e}")
-
-
-    # European Indices
+    # Stream-parse each SDMX-ML response into a quarter-end series and align them
+    from sdmx import fetch_sdmx_xml
+    debt_series = {f"{type} Debt": fetch_sdmx_xml(url, freq="Q") for type, url in urls.items()}
+    debt_securities = pd.concat(debt_series, axis=1, join="outer").sort_index()
+    # Convert to billions
+    debt_securities = debt_securities / 1000
+    if debt_securities.empty:
+        return {}
+    return {"debt_securities": debt_securities}
+
+
+# European Indices
+@source("European Indices", hosts="yahoo", tables="european_indices", cost=15)
+def fetch_european_indices(ctx):
+    import yfinance as yf
     tickers = ["^GDAXI", "^FCHI"]
     # Loop through each ticker and download the data
     european_indices = pd.DataFrame()
-    try:
-        for ticker in tickers:
-            # Download the close prices
-            temp_yf = yf.download(ticker, start="2000-01-01", end=today, interval="1d", auto_adjust=True, progress=False)["Close"]
-            # Rename the column to the ticker name
-            temp_yf.rename(columns={"Close": ticker}, inplace=True)
-            # Merge into the main dataframe
-            if european_indices.empty:
-                european_indices = temp_yf
-            else:
-                european_indices = european_indices.merge(temp_yf, left_index=True, right_index=True, how="outer")
-        european_indices = european_indices.resample("W-FRI").last()
-        european_indices = european_indices.rename(columns={"^GDAXI":"DAX","^FCHI":"CAC40"})
-        # Add to dictionary
-        all_data["european_indices"] = european_indices
-        logging.info("European Indices data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing European Indices: {e}")
-
-
-    # Financial Conditions
+    for ticker in tickers:
+        # Download the close prices
+        with metrics.timed("download"):
+            temp_yf = yf.download(ticker, start="2000-01-01", end=ctx.today, interval="1d", auto_adjust=True, progress=False,
+                                  timeout=deadlines.timeout())["Close"]
+        # Rename the column to the ticker name
+        temp_yf.rename(columns={"Close": ticker}, inplace=True)
+        # Merge into the main dataframe
+        if european_indices.empty:
+            european_indices = temp_yf
+        else:
+            european_indices = european_indices.merge(temp_yf, left_index=True, right_index=True, how="outer")
+    european_indices = european_indices.resample("W-FRI").last()
+    european_indices = european_indices.rename(columns={"^GDAXI":"DAX","^FCHI":"CAC40"})
+    return {"european_indices": european_indices}
+
+
+# Financial Conditions
+@source("Financial Conditions", hosts="fred", tables=("financial_conditions", "fed_fci"), priority=1)
+def fetch_financial_conditions(ctx):
+    fred = ctx.fred
     fci_dict = {
         "USD": "DTWEXBGS",
         "WTI Crude": "DCOILWTICO",
@@ -239,27 +186,17 @@ def run_etl(initial=False, debug=False):
         "FCI Leverage": "NFCILEVERAGE",
         "FCI Credit": "NFCICREDIT",
         "FCI Risk": "NFCIRISK"}
-    # Create empty dataframes
-    fci_df = pd.DataFrame()
-    fed_fci_df = pd.DataFrame()
-    # Loop through both dictionaries and fetch data
-    try:
-        for series_name, series_id in fci_dict.items():
-            fci_df[series_name] = fred.get_series(series_id)
-        for series_name, series_id in fed_fci_dict.items():
-            fed_fci_df[series_name] = fred.get_series(series_id)
-        # Name the date columns
-        fci_df.index.name = "Date"
-        fed_fci_df.index.name = "Date"
-        # Add to all_data dictionary
-        all_data["financial_conditions"] = fci_df
-        all_data["fed_fci"] = fed_fci_df
-        logging.info("Financial Conditions data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Financial Conditions data: {e}")
-
-
-    # Economic Variables (Monthly)
+    # Fetch both dictionaries in batches
+    start = ctx.observation_start("financial_conditions", "fed_fci")
+    fci_df = fred.get_many(fci_dict, observation_start=start)
+    fed_fci_df = fred.get_many(fed_fci_dict, observation_start=start)
+    return {"financial_conditions": fci_df, "fed_fci": fed_fci_df}
+
+
+# Economic Variables (Monthly)
+@source("Economic Conditions", hosts="fred", tables="economic_data", priority=1)
+def fetch_economic_data(ctx):
+    fred = ctx.fred
     economy_dict = {
         # Leading Indicators
         "Building Permits": "PERMIT",
@@ -272,110 +209,106 @@ def run_etl(initial=False, debug=False):
         "Industrial Production": "INDPRO",
         "Labor Force Participation Rate": "CIVPART",
     }
-    # Create empty dataframe and loop through variables
-    economy_df = pd.DataFrame()
-    try:
-        for series_name, series_id in economy_dict.items():
-            economy_df[series_name] = fred.get_series(series_id)
-        economy_df.index.name = "Date"
-        # Data automatically assumes 1st of month -> change to month end
-        economy_df.index = economy_df.index + pd.offsets.MonthEnd(0)
-        # Add Initial Job Claims separately as this is weekly data
-        job_claims = fred.get_series("ICSA")
-        job_claims = job_claims.resample("ME").mean()
-        economy_df["Initial Job Claims"] = job_claims
-        # Shorten to data after 1977 to reduce missing values
-        economy_df = economy_df[economy_df.index > "1977-12-31"]
-        all_data["economic_data"] = economy_df
-        logging.info("Economic Conditions data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Economic data: {e}")
-
-
-    # Banking
+    # Fetch all series in one batch
+    # Start a month early so the monthly average of weekly claims covers a whole month
+    start = ctx.observation_start("economic_data", warmup=pd.DateOffset(months=1))
+    economy_df = fred.get_many(economy_dict, observation_start=start)
+    # Data automatically assumes 1st of month -> change to month end
+    economy_df.index = economy_df.index + pd.offsets.MonthEnd(0)
+    # Add Initial Job Claims separately as this is weekly data
+    job_claims = fred.get_series("ICSA", observation_start=start)
+    job_claims = job_claims.resample("ME").mean()
+    economy_df["Initial Job Claims"] = job_claims
+    # Shorten to data after 1977 to reduce missing values
+    economy_df = economy_df[economy_df.index > "1977-12-31"]
+    return {"economic_data": economy_df}
+
+
+# Banking
+@source("Banking", hosts="fred", tables="banking", priority=1)
+def fetch_banking(ctx):
+    fred = ctx.fred
     bank_weekly = {
         "All Loans & Leases": "TOTLL",
         "Total Bank Assets": "TLAACBW027SBOG",
         "Bank Securities": "SBCACBW027SBOG",
     }
-    banking_df = pd.DataFrame()
-    try:
-        for series_name, series_id in bank_weekly.items():
-            banking_df[series_name] = fred.get_series(series_id)
-        banking_df.index.name = "Date"
-        # Convert weekly data to monthly
-        banking_df = banking_df.resample("ME").mean()
-        # Monthly bank data
-        bank_monthly = {
-            "Consumer Credit": "TOTALSL",
-            "Commercial/Industrial Loans": "BUSLOANS",
-        }
-        bank_temp = pd.DataFrame()
-        for series_name, series_id in bank_monthly.items():
-            bank_temp[series_name] = fred.get_series(series_id)
-        bank_temp.index.name = "Date"
-        bank_temp.index = bank_temp.index + pd.offsets.MonthEnd(0)
-        # Merge dataframes
-        banking_df = pd.merge(banking_df, bank_temp, on='Date', how='left')
-        banking_df["Consumer Credit"] = banking_df["Consumer Credit"]/1000
-        # Add to all_data dictionary
-        all_data["banking"] = banking_df
-        logging.info("Banking data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Banking data: {e}")
-
-
-    # Interest Rates
+    # Start a month early so the first monthly average isn't built from a partial month
+    start = ctx.observation_start("banking", warmup=pd.DateOffset(months=1))
+    banking_df = fred.get_many(bank_weekly, observation_start=start)
+    # Convert weekly data to monthly
+    banking_df = banking_df.resample("ME").mean()
+    # Monthly bank data
+    bank_monthly = {
+        "Consumer Credit": "TOTALSL",
+        "Commercial/Industrial Loans": "BUSLOANS",
+    }
+    bank_temp = fred.get_many(bank_monthly, observation_start=start)
+    bank_temp.index = bank_temp.index + pd.offsets.MonthEnd(0)
+    # Merge dataframes
+    banking_df = pd.merge(banking_df, bank_temp, on='Date', how='left')
+    banking_df["Consumer Credit"] = banking_df["Consumer Credit"]/1000
+    return {"banking": banking_df}
+
+
+# Interest Rates
+@source("Interest Rate", hosts="fred", tables="interest_rates", priority=1)
+def fetch_interest_rates(ctx):
+    fred = ctx.fred
     rates_dict = {
         "Effective Fed Funds": "DFF",
         "SOFR": "SOFR",
         "ECB Deposit Rate": "ECBDFR",
     }
-    # Create empty dataframe and loop through variables
-    rates_df = pd.DataFrame()
-    try:
-        for series_name, series_id in rates_dict.items():
-            rates_df[series_name] = fred.get_series(series_id)
-        rates_df.index.name = "Date"
-        # Resample from daily to monthly data
-        rates_df = rates_df[rates_df.index > "1998-01-01"]
-        #rates_df = rates_df.resample("ME").mean()
-        all_data["interest_rates"] = rates_df
-        logging.info("Interest Rate data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Interest Rate data: {e}")
-
-
-    # r star (r*)
-    # Define the NY Fed URL for retrieving the rstar data and read the file
-    fed_url = "https://www.newyorkfed.org/medialibrary/media/research/economists/williams/data/Laubach_Williams_current_estimates.xlsx"
-    data_file = pd.read_excel(fed_url, sheet_name="data")
+    # Fetch all series in one batch
+    rates_df = fred.get_many(rates_dict, observation_start=ctx.observation_start("interest_rates"))
+    # Resample from daily to monthly data
+    rates_df = rates_df[rates_df.index > "1998-01-01"]
+    #rates_df = rates_df.resample("ME").mean()
+    return {"interest_rates": rates_df}
+
+
+# r star (r*)
+def parse_rstar(file):
+    data_file = pd.read_excel(file, sheet_name="data")
     # Loop through to find starting row for the data
+    start_row = None
     for i in range(0, len(data_file)):
         if data_file.iloc[i, 0] == "Date" and data_file.iloc[i, 2] == "rstar":
             start_row = i + 1
             break
-    # If successfully found the data then proceed
-    if start_row:
-        # Define dates and rstar value series
-        dates = data_file.iloc[start_row:, 0]
-        values = data_file.iloc[start_row:, 2]
-        # Convert dates to datetime values and create the dataframe
-        dates = pd.to_datetime(dates)
-        r_star = pd.DataFrame(data={"r*": values})
-        # Set and adjust the date index, move to quarter's end since these are quarterly estimates
-        r_star.index = dates
-        r_star.index.name = "Date"
-        r_star.index = r_star.index + pd.offsets.QuarterEnd(0)
-        # Add to all_date dictionary
-        all_data["rstar"] = r_star
-        logging.info("rstar data fetched.")
-    else:
-        # If no start_row then there must be a change in the structure of the file
+    # No start_row means the structure of the file changed
+    if not start_row:
+        return pd.DataFrame()
+    # Define dates and rstar value series
+    dates = data_file.iloc[start_row:, 0]
+    values = data_file.iloc[start_row:, 2]
+    # Convert dates to datetime values and create the dataframe
+    dates = pd.to_datetime(dates)
+    r_star = pd.DataFrame(data={"r*": values})
+    # Set and adjust the date index, move to quarter's end since these are quarterly estimates
+    r_star.index = dates
+    r_star.index.name = "Date"
+    r_star.index = r_star.index + pd.offsets.QuarterEnd(0)
+    return r_star
+
+
+@source("rstar", hosts="newyorkfed", tables="rstar")
+def fetch_rstar(ctx):
+    # Define the NY Fed URL for retrieving the rstar data and read the file
+    fed_url = "https://www.newyorkfed.org/medialibrary/media/research/economists/williams/data/Laubach_Williams_current_estimates.xlsx"
+    r_star = ctx.http_cache.fetch_frame(fed_url, parse_rstar)
+    # If nothing was parsed then there must be a change in the structure of the file
+    if r_star.empty:
         logging.info("rstar data not found, file structure must have changed. Please investigate!")
+        return {}
+    return {"rstar": r_star}
 
 
-    # Inflation
+# Inflation
+@source("Inflation", hosts="fred", tables="inflation", priority=1)
+def fetch_inflation(ctx):
+    fred = ctx.fred
     inflation_dict = {
         "Core PCE (Index)": "PCEPILFE",
         "Consumer Price Index": "CPIAUCSL",
@@ -383,21 +316,17 @@ def run_etl(initial=False, debug=False):
         "Prices Paid: Diffusion Index (NY)": "PPCDISA066MSFRBNY",
         "Prices Paid: Diffusion Index (Philly)": "PPCDFSA066MSFRBPHI",
     }
-    # Create empty dataframe and loop through variables
-    inflation_df = pd.DataFrame()
-    try:
-        for series_name, series_id in inflation_dict.items():
-            inflation_df[series_name] = fred.get_series(series_id)
-        inflation_df.index.name = "Date"
-        # Data automatically assumes 1st of month -> change to month end
-        inflation_df.index = inflation_df.index + pd.offsets.MonthEnd(0)
-        all_data["inflation"] = inflation_df
-        logging.info("Inflation data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Inflation data: {e}")
-
-
-    # Government Spending (Quarterly)
+    # Fetch all series in one batch
+    inflation_df = fred.get_many(inflation_dict, observation_start=ctx.observation_start("inflation"))
+    # Data automatically assumes 1st of month -> change to month end
+    inflation_df.index = inflation_df.index + pd.offsets.MonthEnd(0)
+    return {"inflation": inflation_df}
+
+
+# Government Spending (Quarterly)
+@source("Government Spending", hosts="fred", tables="government_spending")
+def fetch_government_spending(ctx):
+    fred = ctx.fred
     govt_dict = {
         "Total Federal Spending": "FGEXPND",
         "Federal Govt Debt": "GFDEBTN",
@@ -406,24 +335,19 @@ def run_etl(initial=False, debug=False):
         "Defense Spending": "FDEFX",
         "Federal Tax & Other Receipts": "FGRECPT",
     }
-    # Create empty dataframe and loop through variables
-    govt_df = pd.DataFrame()
-    try:
-        for series_name, series_id in govt_dict.items():
-            govt_df[series_name] = fred.get_series(series_id) 
-        # Set index name, move to quarter-end and drop NaN
-        govt_df.index.name = "Date"
-        govt_df.index = govt_df.index + pd.offsets.QuarterEnd(0)
-        govt_df = govt_df[govt_df.index > "1966-03-01"]
-        govt_df["Federal Govt Debt"] = govt_df["Federal Govt Debt"] / 1000 # Convert to billions
-        # Add to dictionary
-        all_data["government_spending"] = govt_df
-        logging.info("Government Spending data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Government data: {e}")
-
-
-    # Other Quarterly Datasets
+    # Fetch all series in one batch
+    govt_df = fred.get_many(govt_dict, observation_start=ctx.observation_start("government_spending"))
+    # Move to quarter-end and drop NaN
+    govt_df.index = govt_df.index + pd.offsets.QuarterEnd(0)
+    govt_df = govt_df[govt_df.index > "1966-03-01"]
+    govt_df["Federal Govt Debt"] = govt_df["Federal Govt Debt"] / 1000 # Convert to billions
+    return {"government_spending": govt_df}
+
+
+# Other Quarterly Datasets
+@source("Quarterly", hosts="fred", tables="quarterly_data")
+def fetch_quarterly_data(ctx):
+    fred = ctx.fred
     quarterly_data = {
         "US GDP": "GDP",
         "Real GDP": "GDPC1",
@@ -440,29 +364,24 @@ def run_etl(initial=False, debug=False):
         "Net % Banks Tightening: Credit Card": "DRTSCLCC",
         "Total Mortgage Debt": "ASTMA",
         "Total Private Credit": "CRDQUSAPABIS",
-        "Private Residential Fixed Investment": "PRFI", 
+        "Private Residential Fixed Investment": "PRFI",
         "Real Gross Private Domestic Investment": "GPDIC1",
         "Corporate Debt": "BCNSDODNS",
         "Household Debt": "BOGZ1FL194190005Q",
         "Financial Sector Debt": "DODFS",
     }
-    # Create empty dataframe and loop through variables
-    quarterly_df = pd.DataFrame()
-    try:
-        for series_name, series_id in quarterly_data.items():
-            quarterly_df[series_name] = fred.get_series(series_id)
-        # Set index name, change to quarter-end and shorten dataframe
-        quarterly_df.index.name = "Date"
-        quarterly_df.index = quarterly_df.index + pd.offsets.QuarterEnd(0)
-        quarterly_df = quarterly_df[quarterly_df.index > "1980-01-01"]
-        # Add to dictionary
-        all_data["quarterly_data"] = quarterly_df
-        logging.info("Quarterly data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Quarterly data: {e}")
-
-
-    # Other Monthly Datasets
+    # Fetch all series in one batch
+    quarterly_df = fred.get_many(quarterly_data, observation_start=ctx.observation_start("quarterly_data"))
+    # Change to quarter-end and shorten dataframe
+    quarterly_df.index = quarterly_df.index + pd.offsets.QuarterEnd(0)
+    quarterly_df = quarterly_df[quarterly_df.index > "1980-01-01"]
+    return {"quarterly_data": quarterly_df}
+
+
+# Other Monthly Datasets
+@source("Monthly", hosts="fred", tables="monthly_data")
+def fetch_monthly_data(ctx):
+    fred = ctx.fred
     monthly_data = {
         "Future New Orders (Philadelphia)": "NOFDFSA066MSFRBPHI",
         "Future Business Activity (Texas)": "FBACTSAMFRBDAL",
@@ -475,194 +394,250 @@ def run_etl(initial=False, debug=False):
         "Labour Force Participation 65+": "LNU01375379",
         "US M2": "M2SL",
     }
-    # Create empty dataframe and loop through variables
-    monthly_df = pd.DataFrame()
-    try:
-        for series_name, series_id in monthly_data.items():
-            monthly_df[series_name] = fred.get_series(series_id) 
-        # Set index name, change to month-end and shorten dataframe
-        monthly_df.index.name = "Date"
-        monthly_df.index = monthly_df.index + pd.offsets.MonthEnd(0)
-        monthly_df = monthly_df[monthly_df.index > "1980-01-01"]
-        # Add to dictionary
-        all_data["monthly_data"] = monthly_df
-        logging.info("Monthly data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Monthly data: {e}")
-
-
-    # Annual Data
+    # Fetch all series in one batch
+    monthly_df = fred.get_many(monthly_data, observation_start=ctx.observation_start("monthly_data"))
+    # Change to month-end and shorten dataframe
+    monthly_df.index = monthly_df.index + pd.offsets.MonthEnd(0)
+    monthly_df = monthly_df[monthly_df.index > "1980-01-01"]
+    return {"monthly_data": monthly_df}
+
+
+# Annual Data
+@source("Annual", hosts="fred", tables="annual_data")
+def fetch_annual_data(ctx):
+    fred = ctx.fred
     annual_data = {
         "US % Population 65+": "SPPOP65UPTOZSUSA",
         "US Fertility Rate": "SPDYNTFRTINUSA",
         "Japan % Population 65+": "SPPOP65UPTOZSJPN",
         "Korea Fertility Rate": "SPDYNTFRTINKOR",
     }
-    # Create empty dataframe and loop through variables
-    annual_df = pd.DataFrame()
-    try:
-        for series_name, series_id in annual_data.items():
-            annual_df[series_name] = fred.get_series(series_id)
-        # Set index name, move to year-end and drop NaN
-        annual_df.index.name = "Date"
-        annual_df.index = annual_df.index + pd.offsets.YearEnd(0)
-        annual_df = annual_df.dropna()
-        # Add to dictionary
-        all_data["annual_data"] = annual_df
-        logging.info("Annual data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Annual data: {e}")
-
-
-    # Fed Supply Chain Index Data
+    # Fetch all series in one batch
+    annual_df = fred.get_many(annual_data, observation_start=ctx.observation_start("annual_data"))
+    # Move to year-end and drop NaN
+    annual_df.index = annual_df.index + pd.offsets.YearEnd(0)
+    annual_df = annual_df.dropna()
+    return {"annual_data": annual_df}
+
+
+# Fed Supply Chain Index Data
+def parse_supply_chain(file):
+    supply = pd.read_excel(file, sheet_name="GSCPI Monthly Data")
+    supply = supply[["Date", "GSCPI"]].dropna()
+    supply = supply.set_index("Date")
+    supply.index = pd.to_datetime(supply.index, format='mixed')
+    return supply
+
+
+@source("Supply Chain", hosts="newyorkfed", tables="fed_supply_chain")
+def fetch_supply_chain(ctx):
     supply_url = "https://www.newyorkfed.org/medialibrary/research/interactives/gscpi/downloads/gscpi_data.xlsx"
-    try:
-        supply = pd.read_excel(supply_url, sheet_name="GSCPI Monthly Data")
-        supply = supply[["Date", "GSCPI"]].dropna()
-        supply = supply.set_index("Date")
-        supply.index = pd.to_datetime(supply.index, format='mixed')
-        # Add to dictionary
-        all_data["fed_supply_chain"] = supply
-        logging.info("Supply Chain data fetched.")
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Supply Chain data: {e}")
-
-
-    # Shiller CAPE
+    supply = ctx.http_cache.fetch_frame(supply_url, parse_supply_chain)
+    return {"fed_supply_chain": supply}
+
+
+# Shiller CAPE
+def parse_shiller(file):
+    shiller_df = pd.read_excel(file, sheet_name="Data")
+    # Take dates from first column and convert to datetime
+    shiller_dates = shiller_df["Unnamed: 0"][355:]
+    shiller_dates = shiller_dates.dropna()
+    shiller_dates = [f"{int(x)}.{int(round((x - int(x)) * 100)):02d}" for x in shiller_dates]
+    shiller_dates = pd.to_datetime(shiller_dates, format="%Y.%m")
+    # Real S&P 500, Real Earnings & CAPE P/E Ratio
+    sp500 = shiller_df["Unnamed: 1"][355:]
+    sp500 = pd.to_numeric(sp500, errors='coerce')
+    sp500 = sp500.dropna()
+    real_sp500 = shiller_df["Unnamed: 7"][355:]
+    real_sp500 = real_sp500.dropna()
+    real_earnings = shiller_df["Unnamed: 10"][355:]
+    real_earnings = real_earnings.dropna()
+    cape = shiller_df["Unnamed: 12"][355:]
+    cape = cape.dropna()
+    # Create the dataframe, set the index and move to month-end
+    shiller = pd.DataFrame(data={"Date": shiller_dates, "S&P": sp500, "Real S&P": real_sp500, "Real Earnings": real_earnings, "Shiller"" CAPE P/E Ratio": cape})
+    shiller = shiller.set_index("Date")
+    shiller.index = shiller.index + pd.offsets.MonthEnd(0)
+    # Calculate the trailing 12-month average earnings
+    shiller['TTM Real Earnings'] = shiller['Real Earnings'].shift(1).rolling(window=12, min_periods=1).mean()
+    # Calculate the TTM P/E Ratio
+    shiller['TTM P/E Ratio'] = shiller['Real S&P'] / shiller['TTM Real Earnings']
+    return shiller
+
+
+@source("Shiller", hosts="shiller", tables="shiller_data", priority=3)
+def fetch_shiller(ctx):
     shiller_url = "https://img1.wsimg.com/blobby/go/e5e77e0b-59d1-44d9-ab25-4763ac982e53/downloads/b152b405-8563-4eec-b5c0-b49f95f4e8cf/ie_data.xls?ver=1746381879934"
-    # Initialize shiller
-    shiller = None
-    try:
-        shiller_df = pd.read_excel(shiller_url, sheet_name="Data")
-        # Take dates from first column and convert to datetime
-        shiller_dates = shiller_df["Unnamed: 0"][355:]
-        shiller_dates = shiller_dates.dropna()
-        shiller_dates = [f"{int(x)}.{int(round((x - int(x)) * 100)):02d}" for x in shiller_dates]
-        shiller_dates = pd.to_datetime(shiller_dates, format="%Y.%m")
-        # Real S&P 500, Real Earnings & CAPE P/E Ratio
-        sp500 = shiller_df["Unnamed: 1"][355:]
-        sp500 = pd.to_numeric(sp500, errors='coerce')
-        sp500 = sp500.dropna()
-        real_sp500 = shiller_df["Unnamed: 7"][355:]
-        real_sp500 = real_sp500.dropna()
-        real_earnings = shiller_df["Unnamed: 10"][355:]
-        real_earnings = real_earnings.dropna()
-        cape = shiller_df["Unnamed: 12"][355:]
-        cape = cape.dropna()
-        # Create the dataframe, set the index and move to month-end
-        shiller = pd.DataFrame(data={"Date": shiller_dates, "S&P": sp500, "Real S&P": real_sp500, "Real Earnings": real_earnings, "Shiller"" CAPE P/E Ratio": cape})
-        shiller = shiller.set_index("Date")
-        shiller.index = shiller.index + pd.offsets.MonthEnd(0)
-        # Calculate the trailing 12-month average earnings
-        shiller['TTM Real Earnings'] = shiller['Real Earnings'].shift(1).rolling(window=12, min_periods=1).mean()
-        # Calculate the TTM P/E Ratio
-        shiller['TTM P/E Ratio'] = shiller['Real S&P'] / shiller['TTM Real Earnings']
-    except Exception as e:
-        logging.error(f"Error occurred while fetching or processing Shiller data: {e}")
-    # Add to dictionary
-    if shiller is not None:
-        all_data["shiller_data"] = shiller
-        logging.info("Shiller data fetched.")
-
-
-    # Global M2 & ISM => Read from historical data file
-    historical = pd.read_excel(data_path, sheet_name=None)
+    shiller = ctx.http_cache.fetch_frame(shiller_url, parse_shiller)
+    return {"shiller_data": shiller}
+
+
+# Global M2 & ISM => Read from historical data file
+@source("Global M2 & ISM", hosts="local", tables=("global_m2", "ism"), cost=2)
+def fetch_historical(ctx):
+    # Only the two sheets needed, served from the Parquet sidecar cache unless the workbook changed
+    from workbook_cache import read_sheets
+    historical = read_sheets(data_path, ["Global M2", "ISM"])
     # Global M2
     gm2 = historical["Global M2"]
     gm2 = gm2.set_index("Date")
-    all_data["global_m2"] = gm2
     # ISM
     ism = historical["ISM"]
     ism = ism.set_index("Date")
-    all_data["ism"] = ism
-            
+    return {"global_m2": gm2, "ism": ism}
+
 
-    # Crypto Data
-    if initial:
+# Crypto Data
+@source("Crypto", hosts="coingecko", tables="crypto", cost=30)
+def fetch_crypto(ctx):
+    from coingecko import BACKFILL_START, COINS, CoinGeckoFetcher
+    from workbook_cache import read_sheet
+    end = pd.Timestamp(ctx.today)
+    if ctx.initial:
         # Read historical data from Excel file
-        crypto = pd.read_excel(data_path, sheet_name="Crypto")
+        crypto = read_sheet(data_path, "Crypto")
         crypto = crypto.set_index("Date")
+        stored_tokens = list(crypto.columns)
+        last = crypto.index[-1]
     else:
-        # Read from SQL database
-        crypto = load_table("crypto")
-    # Get timestamps for today and start date
-    today_dt = datetime(today.year, today.month, today.day, tzinfo=timezone.utc)
-    today_ms = int(today_dt.timestamp())
-    start_date = today + pd.Timedelta(weeks=-35)
-    start_date_dt = datetime(start_date.year, start_date.month, start_date.day, tzinfo=timezone.utc)
-    start_date_ms = int(start_date_dt.timestamp())
-    # Create empty dataframe and dictionary
-    crypto_api = pd.DataFrame()
-    crypto_urls = {}
-    crypto_urls["BTC"] = f"https://api.coingecko.com/api/v3/coins/bitcoin/market_chart/range?vs_currency=usd&from={start_date_ms}&to={today_ms}"
-    crypto_urls["ETH"] = f"https://api.coingecko.com/api/v3/coins/ethereum/market_chart/range?vs_currency=usd&from={start_date_ms}&to={today_ms}"
-    crypto_urls["SOL"] = f"https://api.coingecko.com/api/v3/coins/solana/market_chart/range?vs_currency=usd&from={start_date_ms}&to={today_ms}"
-    crypto_urls["SUI"] = f"https://api.coingecko.com/api/v3/coins/sui/market_chart/range?vs_currency=usd&from={start_date_ms}&to={today_ms}"
-    # Loop through each token
-    for token, url in crypto_urls.items():
-        response = requests.get(url)
-        if response.status_code != 200:
-            logging.error(f"Error downloading data for {token}")
-        prices = response.json().get("prices", [])
-        temp_df = pd.DataFrame(prices, columns=["Date", token])
-        temp_df["Date"] = pd.to_datetime(temp_df["Date"], unit='ms')
-        # Merge on 'Date'
-        if crypto_api.empty:
-            crypto_api = temp_df
-        else:
-            crypto_api = pd.merge(crypto_api, temp_df, on='Date', how='outer')
-        time.sleep(1)
-    # Set date index
-    crypto_api = crypto_api.set_index("Date")
-    # Add the new data to the existing data
-    last = crypto.index[-1]
-    crypto_api = crypto_api[crypto_api.index > last]
-    crypto_merged = pd.concat([crypto, crypto_api], axis=0)
-    all_data["crypto"] = crypto_merged
-    logging.info("Crypto data fetched.")
-
-
-        
-    # Loop through each dataframe in the dictionary and add to SQL database
-    for table_name, df in all_data.items():
-        # If --initial argument is used, create new tables in database
-        if initial:
-            # Replace the table with the full dataset
-            df.to_sql(table_name, engine, if_exists='replace', index=True)
-            logging.info(f"Table '{table_name}' created.")
-        else:
-            # Incremental load: insert only new rows
-            latest_date_query = f"""SELECT MAX("Date") FROM {table_name};"""
-            latest_date = pd.read_sql(latest_date_query, engine).iloc[0, 0]
-
-            if latest_date is not None:
-                df = df[df.index > latest_date]
-            
-            if not df.empty:
-                df.to_sql(table_name, engine, if_exists='append', index=True)
-                logging.info(f"Appended {len(df)} new rows to '{table_name}'.")
-            else:
-                logging.info(f"No new data for '{table_name}'.")
-                
-
-    # Save to Excel if in debug mode
+        # Only the stored watermark and column names are needed, not the whole table
+        crypto = None
+        stored_tokens = []
+        last = ctx.watermarks.get("crypto")
+        if last is not None:
+            stored_tokens = [c["name"] for c in inspect(ctx.engine).get_columns("crypto") if c["name"] != "Date"]
+    # Tokens already stored are fetched from the watermark forward, new ones are backfilled in full
+    starts = {}
+    for token in COINS:
+        starts[token] = last if token in stored_tokens and last is not None else BACKFILL_START
+    crypto_api = CoinGeckoFetcher().fetch(starts, end)
+    backfilled = [t for t, start in starts.items() if start == BACKFILL_START]
+    if backfilled:
+        logging.info(f"Backfilled crypto history for {', '.join(backfilled)}.")
+        # Older rows are rewritten with the new columns, so merge with what is stored for the other tokens
+        if crypto is None:
+            # Read through the run's own engine: the page-side table cache may hold an older copy
+            crypto = pd.read_sql_table("crypto", ctx.engine, index_col="Date", parse_dates=["Date"]) if last is not None else pd.DataFrame()
+        crypto_merged = crypto_api.combine_first(crypto)[list(dict.fromkeys([*crypto.columns, *crypto_api.columns]))]
+        crypto_merged.attrs["diff_start"] = crypto_api.index.min()
+    else:
+        # Add the new data to the existing data
+        crypto_api = crypto_api[crypto_api.index > last]
+        crypto_merged = crypto_api if crypto is None else pd.concat([crypto, crypto_api], axis=0)
+    crypto_merged.index.name = "Date"
+    return {"crypto": crypto_merged}
+
+
+def run_etl(initial=False, debug=False, deadline=None, only=None, skip=None, predictions=RUN_PREDICTIONS):
+    # deadline (a deadlines.Deadline) bounds the whole run: sources get time budgets, whatever is
+    # still running when the fetch window closes is dropped, and loading stops at the deadline.
+    # only/skip (source or table names) restrict the run to part of the source graph.
+    # predictions=True also updates the ISM models from the freshly loaded tables.
+    sources = select_sources(only=only, skip=skip)
+    if only or skip:
+        logging.info(f"Running {len(sources)} sources: {', '.join(src.name for src in sources)}")
+    started_at = datetime.now(timezone.utc)
+    # Define the SQL engine
+    engine = get_engine("etl_writer_pw")
+    # Initialize the pooled FRED client
+    load_dotenv()
+    FRED_API_KEY = os.getenv("FRED_API_KEY")
+    fred = FredClient(api_key=FRED_API_KEY, concurrency=HOST_LIMITS["fred"])
+    # Read the watermark catalog once; incremental runs only fetch from each table's watermark
+    catalog = read_catalog(engine, source_tables(sources) + list(DERIVED))
+    watermarks = {} if initial else watermarks_from(catalog)
+    # Run every registered source concurrently and gather the results
+    ctx = RunContext(initial=initial, today=dt_date.today(), run_id=new_run_id(), fred=fred, engine=engine,
+                     watermarks=watermarks, http_cache=HttpCache())
+    fetch_deadline = None
+    costs = {}
+    if deadline is not None:
+        # Keep part of the remaining time for loading what was fetched
+        reserve = min(LOAD_RESERVE_SECONDS, deadline.remaining() * 0.3)
+        fetch_deadline = deadlines.Deadline(at=deadline.at - reserve)
+        costs = metrics.recent_costs(engine)
+    fetch_start = time.perf_counter()
+    all_data, results = run_sources(ctx, sources, deadline=fetch_deadline, costs=costs)
+    fetch_seconds = time.perf_counter() - fetch_start
+    fred.close()
+    ctx.http_cache.log_stats()
+
+
+    # Bulk load every dataframe in the dictionary into the SQL database
+    load_start = time.perf_counter()
+    load_deadline = None if deadline is None else deadlines.Deadline(at=deadline.at - DEADLINE_MARGIN_SECONDS)
+    load_stats = write_tables(all_data, engine, catalog=catalog, run_id=ctx.run_id, initial=initial,
+                              lookback=ctx.lookback, deadline=load_deadline)
+    # Recompute the derived tables (YoY%, ratios, credit impulse) over the window their inputs changed in
+    derived_stats = update_derived(engine, catalog, load_stats, run_id=ctx.run_id, initial=initial, deadline=load_deadline)
+    # Update the ISM predictions if their input tables changed
+    if predictions and (load_deadline is None or not load_deadline.expired()):
+        from predictions import run_predictions
+        try:
+            run_predictions(engine=engine, catalog=catalog, run_id=ctx.run_id)
+        except Exception as e:
+            logging.error(f"Error occurred while updating predictions: {e}")
+    load_seconds = time.perf_counter() - load_start
+
+
+    # Record per-source and per-table metrics in macro_etl_metrics.jsonl and etl_runs / etl_run_sources
+    record = metrics.build_run(ctx.run_id, started_at, initial, results, load_stats, fetch_seconds, load_seconds)
+    metrics.publish(engine, record)
+
+
+    # Publish the updated tables to the Arrow store and build the pages' figures for the new data
+    written = {**load_stats, **derived_stats}
+    if PUBLISH_ARROW:
+        from arrow_store import publish
+        publish(engine, catalog, [t for t, s in written.items() if s["inserted"] or s["updated"]])
+    if PREBUILD_FIGURES and any(s["inserted"] or s["updated"] for s in written.values()):
+        from figure_cache import prebuild
+        try:
+            prebuild()
+        except Exception as e:
+            logging.warning(f"Figure prebuild failed: {e}")
+
+
+    # Save a Parquet snapshot of the run if in debug mode
     if debug:
-        with pd.ExcelWriter(os.path.join(os.getcwd(),"data","data_debug.xlsx"), engine="xlsxwriter") as data_writer:
-            for sheet_name, df in all_data.items():
-                df.to_excel(data_writer, sheet_name=sheet_name)
-        logging.info("Debug data saved to Excel.")
+        from snapshots import write_snapshot
+        write_snapshot(all_data, ctx.run_id)
+
+    return {
+        "run_id": ctx.run_id,
+        "loaded": list(load_stats) + list(derived_stats),
+        "skipped": {r.name: r.status for r in results if r.status in ("timeout", "skipped")},
+        "failed": [r.name for r in results if r.status == "failed"],
+        "not_loaded": [t for t in all_data if t not in load_stats],
+    }
+
+
+def _names(value):
+    # Event payloads may give a single name or a list
+    if value is None or isinstance(value, list):
+        return value
+    return [value]
 
 
 # Lambda entrypoint
 def lambda_handler(event, context):
-    run_etl(initial=False, debug=False)
-    return {"statusCode": 200, "body": "ETL run complete"}
+    # Plan the run around the invocation's remaining time so tables fetched in time are always committed
+    deadline = None
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        deadline = deadlines.Deadline(seconds=context.get_remaining_time_in_millis() / 1000)
+    # The event can restrict the run, e.g. {"only": ["crypto"]} or {"skip": ["debt_securities"]}
+    event = event or {}
+    summary = run_etl(initial=False, debug=False, deadline=deadline, only=_names(event.get("only")), skip=_names(event.get("skip")))
+    return {"statusCode": 200, "body": json.dumps({"message": "ETL run complete", **summary})}
 
 # Local/manual entrypoint
 if __name__ == "__main__":
     # Add parser logic to differentiate between initial run and update runs
     parser = argparse.ArgumentParser(description="ETL script for macro data.")
     parser.add_argument("--initial", action="store_true", help="Run full load and recreate tables.")
-    parser.add_argument("--debug", action="store_true", help="Runs script in debug mode which saves to Excel instead of SQL")
+    parser.add_argument("--debug", action="store_true", help="Also saves a Parquet snapshot of every table under data/snapshots/<run id>")
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="Only run these sources or tables (and what they depend on).")
+    parser.add_argument("--skip", nargs="+", metavar="NAME", help="Don't run these sources or tables (or what depends on them).")
+    parser.add_argument("--predictions", action="store_true", default=RUN_PREDICTIONS, help="Also update the ISM predictions if their inputs changed.")
     args = parser.parse_args()
-    run_etl(args.initial, args.debug)
\ No newline at end of file
+    run_etl(args.initial, args.debug, only=args.only, skip=args.skip, predictions=args.predictions)
@@ -0,0 +1,161 @@
+import functools
+import glob
+import hashlib
+import inspect
+import json
+import logging
+import os
+import pandas as pd
+import plotly
+import plotly.graph_objects as go
+import threading
+import time
+
+from collections import OrderedDict
+
+
+# Figures built by the plot helpers are kept as plotly JSON in memory (per process) and on disk (shared by
+# every session and process on the host, and by the ETL's prebuild). Entries are keyed by the helper, its
+# chart arguments and a fingerprint of the frames it plots, so new data from the ETL means a new key.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIGURE_CACHE_DIR = os.getenv("FIGURE_CACHE_DIR", os.path.join(BASE_DIR, "data", "figures"))
+FIGURE_CACHE_SIZE = int(os.getenv("FIGURE_CACHE_SIZE", "512"))
+# Files not used for this many days are removed by prebuild()
+FIGURE_CACHE_MAX_AGE_DAYS = float(os.getenv("FIGURE_CACHE_MAX_AGE_DAYS", "7"))
+# Pages run by prebuild(): the entry page and everything under pages/
+PAGES = [os.path.join(BASE_DIR, "_01. Business Cycle.py")] + sorted(glob.glob(os.path.join(BASE_DIR, "pages", "*.py")))
+
+_lock = threading.Lock()
+_memory = OrderedDict()
+stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def _fingerprint(value):
+    # Frames and series hash by content (dates, values and column names); everything else by repr
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest = hashlib.sha256(pd.util.hash_pandas_object(value, index=True, categorize=False).to_numpy().tobytes())
+        columns = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+        digest.update(repr(list(columns)).encode())
+        return digest.hexdigest()
+    return repr(value)
+
+
+def figure_key(name, arguments, salt=""):
+    parts = [name, plotly.__version__, str(salt)] + [f"{k}={_fingerprint(v)}" for k, v in arguments.items()]
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+
+def _path(key):
+    return os.path.join(FIGURE_CACHE_DIR, f"{key}.json")
+
+
+def _remember(key, spec):
+    with _lock:
+        _memory[key] = spec
+        _memory.move_to_end(key)
+        while len(_memory) > FIGURE_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+def _read(key):
+    with _lock:
+        spec = _memory.get(key)
+        if spec is not None:
+            _memory.move_to_end(key)
+            stats["hits"] += 1
+            return spec
+    try:
+        with open(_path(key)) as f:
+            spec = json.load(f)
+        os.utime(_path(key))
+    except (OSError, ValueError):
+        return None
+    with _lock:
+        stats["disk_hits"] += 1
+    _remember(key, spec)
+    return spec
+
+
+def _write(key, fig):
+    spec = json.loads(fig.to_json())
+    _remember(key, spec)
+    try:
+        os.makedirs(FIGURE_CACHE_DIR, exist_ok=True)
+        # Write then rename so other processes never read a half-written file
+        tmp = f"{_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(spec, f)
+        os.replace(tmp, _path(key))
+    except OSError as e:
+        logging.warning(f"Could not write figure cache file: {e}")
+    return spec
+
+
+def cached_figure(salt=""):
+    # Decorator for functions returning a plotly Figure from frames and chart arguments. Each call
+    # returns a new Figure (built from the cached JSON without re-validating it), so callers can still
+    # update it. salt covers settings read outside the arguments (e.g. module-level thresholds).
+    def decorate(func):
+        signature = inspect.signature(func)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = figure_key(func.__name__, bound.arguments, salt)
+            spec = _read(key)
+            if spec is None:
+                with _lock:
+                    stats["misses"] += 1
+                spec = _write(key, func(*args, **kwargs))
+            return go.Figure(spec, _validate=False)
+        return wrapper
+    return decorate
+
+
+def clear(disk=False):
+    with _lock:
+        _memory.clear()
+    if disk:
+        for path in glob.glob(os.path.join(FIGURE_CACHE_DIR, "*.json")):
+            os.remove(path)
+
+
+def prune(max_age_days=FIGURE_CACHE_MAX_AGE_DAYS):
+    # Removes cache files that haven't been read or written for max_age_days
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for path in glob.glob(os.path.join(FIGURE_CACHE_DIR, "*.json")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def prebuild(pages=None, timeout=120):
+    # Runs every page headless (Streamlit's AppTest) so its figures are built once into the disk cache
+    # before the first visitor. Called by the ETL after it writes new data; returns {page: seconds}.
+    from streamlit.testing.v1 import AppTest
+    timings = {}
+    for page in pages or PAGES:
+        started = time.perf_counter()
+        try:
+            app = AppTest.from_file(page, default_timeout=timeout).run()
+            if app.exception:
+                logging.warning(f"Page {os.path.basename(page)} failed while prebuilding figures: {app.exception[0].message}")
+                continue
+        except Exception as e:
+            logging.warning(f"Could not prebuild figures for {os.path.basename(page)}: {e}")
+            continue
+        timings[os.path.basename(page)] = time.perf_counter() - started
+    removed = prune()
+    logging.info(f"Prebuilt figures for {len(timings)} pages in {sum(timings.values()):.1f}s "
+                 f"({stats['misses']} built, {removed} old files removed).")
+    return timings
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    prebuild()
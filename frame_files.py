@@ -0,0 +1,21 @@
+import os
+import pandas as pd
+import pyarrow as pa
+
+
+# Frames saved to local files by the workbook cache and the run snapshots: Parquet where possible,
+# pickle for frames Arrow can't type (e.g. a column of dates mixed with strings)
+
+
+def write_frame(df, path_stem, compression="snappy"):
+    # Writes path_stem.parquet, or path_stem.pkl as the fallback; returns the file name written
+    try:
+        df.to_parquet(f"{path_stem}.parquet", compression=compression)
+        return os.path.basename(path_stem) + ".parquet"
+    except (pa.ArrowException, TypeError, ValueError):
+        df.to_pickle(f"{path_stem}.pkl")
+        return os.path.basename(path_stem) + ".pkl"
+
+
+def read_frame(path):
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
@@ -0,0 +1,104 @@
+import deadlines
+import logging
+import metrics
+import os
+import pandas as pd
+import requests
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from ratelimit import TokenBucket
+from requests.adapters import HTTPAdapter
+
+
+# FRED allows 120 requests per minute per API key
+FRED_API_URL = os.getenv("FRED_API_URL", "https://api.stlouisfed.org/fred")
+FRED_REQUESTS_PER_MINUTE = int(os.getenv("FRED_REQUESTS_PER_MINUTE", "120"))
+FRED_POOL_SIZE = int(os.getenv("FRED_POOL_SIZE", "8"))
+# Failed requests (connection errors, timeouts and these statuses) are retried with exponential backoff
+FRED_MAX_RETRIES = int(os.getenv("FRED_MAX_RETRIES", "3"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FredClient:
+    # Pooled, rate-limited replacement for fredapi.Fred
+    def __init__(self, api_key, base_url=FRED_API_URL, requests_per_minute=FRED_REQUESTS_PER_MINUTE,
+                 pool_size=FRED_POOL_SIZE, concurrency=1, timeout=30, max_retries=FRED_MAX_RETRIES, backoff=1.0):
+        # pool_size is the thread count of one get_many call; concurrency is how many sources may call
+        # get_many at once, and the connection pool holds enough keep-alive connections for all of them
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # Spread the per-minute quota evenly but allow a short burst at the start of a run
+        self.bucket = TokenBucket(rate=requests_per_minute / 60, capacity=min(10, requests_per_minute))
+        # One keep-alive session shared by every thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size * concurrency, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.requests_made = 0
+
+    def get_series(self, series_id, observation_start=None, observation_end=None):
+        # Returns a float Series indexed by observation date, missing values ('.') as NaN
+        params = {"series_id": series_id, "api_key": self.api_key, "file_type": "json"}
+        if observation_start is not None:
+            params["observation_start"] = pd.Timestamp(observation_start).strftime("%Y-%m-%d")
+        if observation_end is not None:
+            params["observation_end"] = pd.Timestamp(observation_end).strftime("%Y-%m-%d")
+        response = self._get(f"{self.base_url}/series/observations", params)
+        response.raise_for_status()
+        with metrics.timed("parse"):
+            observations = response.json().get("observations", [])
+            dates = pd.to_datetime([obs["date"] for obs in observations])
+            values = pd.to_numeric(pd.Series([obs["value"] for obs in observations], dtype=object), errors="coerce")
+            return pd.Series(values.to_numpy(dtype=float), index=dates, name=series_id)
+
+    def _get(self, url, params):
+        # Retries are done here rather than by urllib3 so every attempt checks the source's deadline and
+        # gets a timeout capped to the time left, and a backoff that would outlast the deadline isn't slept
+        for attempt in range(self.max_retries + 1):
+            metrics.add_time("throttle", self.bucket.acquire())
+            try:
+                with metrics.timed("download"):
+                    response = self.session.get(url, params=params, timeout=deadlines.timeout(self.timeout))
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            else:
+                self.requests_made += 1
+                metrics.record_response(response)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+                delay = self.backoff * 2 ** attempt
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+            deadline = deadlines.current()
+            if deadline is not None and deadline.remaining() <= delay:
+                raise deadlines.DeadlineExceeded(f"no time left to retry {params.get('series_id')}")
+            metrics.count("retries")
+            time.sleep(delay)
+
+    def get_many(self, series_ids, observation_start=None, how="left"):
+        # Fetches several series concurrently and returns them as one aligned DataFrame.
+        # series_ids is either a list of ids or a dict of {column name: id}.
+        # how="left" aligns everything to the first series, which is what assigning the series
+        # into an empty DataFrame one at a time does; how="outer" keeps every date.
+        if not isinstance(series_ids, dict):
+            series_ids = {series_id: series_id for series_id in series_ids}
+        names = list(series_ids)
+        with ThreadPoolExecutor(max_workers=min(self.pool_size, max(1, len(names)))) as pool:
+            fetched = list(pool.map(metrics.propagate(lambda name: self.get_series(series_ids[name], observation_start)), names))
+        df = pd.concat(dict(zip(names, fetched)), axis=1, join="outer")
+        if how == "left" and fetched:
+            df = df.reindex(fetched[0].index)
+        df.index.name = "Date"
+        logging.debug(f"Fetched {len(names)} FRED series ({self.requests_made} requests this run).")
+        return df
+
+    def close(self):
+        self.session.close()
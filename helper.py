@@ -1,40 +1,42 @@
-import boto3, json, os
+import os
 import pandas as pd
 import plotly.graph_objects as go
 
+from db import get_engine, get_secret, load_table, load_tables, load_watermarks
+from figure_cache import cached_figure
 from plotly.subplots import make_subplots
-from sqlalchemy import create_engine
+from transforms import lttb
 
-# Load SQL database
-def get_secret(secret_name, region_name="us-west-2"):
-    client = boto3.client("secretsmanager", region_name=region_name)
-    resp = client.get_secret_value(SecretId=secret_name)
-    return json.loads(resp["SecretString"])
+# Loaded tables are shared by every session (memory-mapped from the Arrow store, see db.py), so pages get
+# copy-on-write views of them: adding or changing columns copies just what changes, never the shared data
+pd.set_option("mode.copy_on_write", True)
 
-def get_engine(user_secret):
-    # Opens connection to database
-    creds = get_secret(user_secret)
-    return create_engine(
-        f"postgresql://{creds['DB_USER']}:{creds['DB_PASS']}@{creds['DB_HOST']}:{creds['DB_PORT']}/{creds['DB_NAME']}"
-    )
-    
-def load_table(table_name):
-    # Loads a table from the database
-    engine = get_engine(user_secret="etl_readonly_pw")
-    df = pd.read_sql_table(table_name, con=engine, index_col="Date", parse_dates=["Date"])
-    return df
+# Each line is downsampled (LTTB) to at most PLOT_MAX_POINTS points over the plotted date range (0 turns it off).
+# Lines that still have more than PLOT_WEBGL_POINTS points are drawn with WebGL (Scattergl); browsers cap the
+# number of WebGL contexts per page, so this is kept for the few really long series.
+MAX_POINTS = int(os.getenv("PLOT_MAX_POINTS", "2000"))
+WEBGL_POINTS = int(os.getenv("PLOT_WEBGL_POINTS", "5000"))
 
 
-def plot_datasets(primary_df, secondary_df, primary_series, secondary_series, start_date, primary_range=None, secondary_range=None):
+def scatter(series, name=None, max_points=MAX_POINTS, **kwargs):
+    # Line trace for a date-indexed Series: downsampled to max_points, and Scattergl above WEBGL_POINTS
+    if max_points:
+        series = lttb(series, max_points)
+    trace = go.Scattergl if len(series) > WEBGL_POINTS else go.Scatter
+    return trace(x=series.index, y=series, name=name if name is not None else series.name, **kwargs)
+
+
+@cached_figure(salt=WEBGL_POINTS)
+def plot_datasets(primary_df, secondary_df, primary_series, secondary_series, start_date, primary_range=None, secondary_range=None, max_points=MAX_POINTS):
     # Initialize
     fig = make_subplots(specs=[[{"secondary_y": True}]])
     # Adjust dates
     primary_df = primary_df[primary_df.index > start_date]
     secondary_df = secondary_df[secondary_df.index > start_date]
     # Primary Y-axis
-    fig.add_trace(go.Scatter(x=primary_df.index, y=primary_df[primary_series], name=primary_series), secondary_y=False)
+    fig.add_trace(scatter(primary_df[primary_series], name=primary_series, max_points=max_points), secondary_y=False)
     # Secondary Y-axis
-    fig.add_trace(go.Scatter(x=secondary_df.index, y=secondary_df[secondary_series], name=secondary_series, line=dict(color="orange")), secondary_y=True)
+    fig.add_trace(scatter(secondary_df[secondary_series], name=secondary_series, max_points=max_points, line=dict(color="orange")), secondary_y=True)
     # Add axis titles
     if primary_range:
         fig.update_yaxes(title_text=primary_series, secondary_y=False, range=primary_range)
@@ -49,12 +51,13 @@ def plot_datasets(primary_df, secondary_df, primary_series, secondary_series, st
     return fig
 
 
-def basic_plot(df, series_name, start_date, series_range=None):
+@cached_figure(salt=WEBGL_POINTS)
+def basic_plot(df, series_name, start_date, series_range=None, max_points=MAX_POINTS):
     # Adjust start date
     df = df[df.index > start_date]
     # Initialize
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df.index, y=df[series_name], name=series_name))
+    fig.add_trace(scatter(df[series_name], name=series_name, max_points=max_points))
     # If range provided, update the axis
     if series_range:
         fig.update_yaxes(title_text=series_name, range=series_range)
@@ -63,12 +66,13 @@ def basic_plot(df, series_name, start_date, series_range=None):
     return fig
 
 
-def plot_with_constant(df, series_name, constant_y, start_date, series_range=None):
+@cached_figure(salt=WEBGL_POINTS)
+def plot_with_constant(df, series_name, constant_y, start_date, series_range=None, max_points=MAX_POINTS):
     # Adjust start date
     df = df[df.index > start_date]
     # Initialize
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df.index, y=df[series_name], name=series_name))
+    fig.add_trace(scatter(df[series_name], name=series_name, max_points=max_points))
     # If range provided, update the axis
     if series_range:
         fig.update_yaxes(title_text=series_name, range=series_range)
@@ -0,0 +1,126 @@
+import deadlines
+import glob
+import hashlib
+import inspect
+import json
+import logging
+import metrics
+import os
+import pandas as pd
+import requests
+import threading
+
+from io import BytesIO
+
+
+# Lambda can only write to /tmp, everywhere else keep the cache next to the data folder
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+    DEFAULT_CACHE_DIR = "/tmp/macro_etl_cache"
+else:
+    DEFAULT_CACHE_DIR = os.path.join(BASE_DIR, "data", "cache")
+CACHE_DIR = os.getenv("ETL_CACHE_DIR", DEFAULT_CACHE_DIR)
+
+
+class HttpCache:
+    # On-disk cache of raw downloads plus the frame parsed from them, revalidated with
+    # conditional GETs (ETag / Last-Modified) so unchanged files are neither downloaded nor parsed
+    def __init__(self, cache_dir=CACHE_DIR, session=None):
+        self.cache_dir = cache_dir
+        self.session = session or requests.Session()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()[:24]
+        base = os.path.join(self.cache_dir, key)
+        return base + ".meta.json", base + ".body", base
+
+    @staticmethod
+    def _parser_key(parse, version):
+        # Identifies the parser a cached frame was built with: its name, the caller's version and its
+        # bytecode and constants, so editing the parser (or bumping version for a change in something
+        # it calls) invalidates the frame instead of serving the old parser's output on every 304
+        parts = [getattr(parse, "__module__", ""), getattr(parse, "__qualname__", repr(parse)), str(version)]
+        code = getattr(parse, "__code__", None)
+        if code is not None:
+            parts += [code.co_code.hex(), repr([c for c in code.co_consts if not inspect.iscode(c)])]
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read_meta(self, meta_path):
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, url, headers=None, timeout=None):
+        # Returns (path of the cached body, changed). changed is False when the server answered
+        # 304 Not Modified and the copy on disk is still current.
+        meta_path, body_path, _ = self._paths(url)
+        meta = self._read_meta(meta_path)
+        request_headers = dict(headers or {})
+        if meta and os.path.exists(body_path):
+            if meta.get("etag"):
+                request_headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                request_headers["If-Modified-Since"] = meta["last_modified"]
+        with metrics.timed("download"):
+            response = self.session.get(url, headers=request_headers, timeout=deadlines.timeout(timeout))
+        metrics.record_response(response)
+        if response.status_code == 304 and meta:
+            with self._lock:
+                self.hits += 1
+                self.bytes_saved += meta.get("size", 0)
+            metrics.count("cache_hits")
+            return body_path, False
+        response.raise_for_status()  # Raises a 403 or other HTTPError if one occurs
+        with self._lock:
+            self.misses += 1
+        metrics.count("cache_misses")
+        content = response.content
+        self._write_atomic(body_path, content)
+        new_meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "size": len(content),
+        }
+        self._write_atomic(meta_path, json.dumps(new_meta).encode())
+        return body_path, True
+
+    def fetch_frame(self, url, parse, headers=None, timeout=None, version=None):
+        # Downloads url (conditionally) and returns parse(BytesIO) -> DataFrame.
+        # When the file is unchanged and the parser is the same, the previously parsed frame is reused
+        # and parse never runs.
+        _, _, base = self._paths(url)
+        frame_path = f"{base}.{self._parser_key(parse, version)}.frame.pkl"
+        body_path, changed = self.get(url, headers=headers, timeout=timeout)
+        if not changed and os.path.exists(frame_path):
+            return pd.read_pickle(frame_path)
+        with open(body_path, "rb") as f, metrics.timed("parse"):
+            df = parse(BytesIO(f.read()))
+        tmp = f"{frame_path}.{threading.get_ident()}.tmp"
+        df.to_pickle(tmp)
+        os.replace(tmp, frame_path)
+        # Frames of this url built by other parsers (or an older version of this one) are stale
+        for old in glob.glob(f"{glob.escape(base)}.*frame.pkl"):
+            if old != frame_path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        return df
+
+    def log_stats(self):
+        logging.info(f"HTTP cache: {self.hits} hits, {self.misses} misses, {self.bytes_saved / 1e6:.1f} MB saved.")
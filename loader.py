@@ -0,0 +1,189 @@
+import hashlib
+import logging
+import pandas as pd
+import time
+
+from catalog import update_entry, watermarks_from
+from io import StringIO
+from pandas.api.types import is_numeric_dtype
+from sqlalchemy import inspect
+
+
+# Every table is keyed on its "Date" index
+KEY = "Date"
+
+
+def quote(identifier):
+    # Quote a table/column name for PostgreSQL (column names contain spaces, %, / etc.)
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _prepare(df):
+    df = df.copy()
+    if df.index.name is None:
+        df.index.name = KEY
+    # Duplicate dates would make ON CONFLICT touch the same row twice in one statement
+    return df[~df.index.duplicated(keep="last")]
+
+
+def _to_csv_buffer(df):
+    buffer = StringIO()
+    df.to_csv(buffer, header=False, index=True, na_rep="")
+    buffer.seek(0)
+    return buffer
+
+
+def _ensure_table(conn, df, table_name, replace):
+    # Let pandas create the (empty) table so column types match the old to_sql path,
+    # then add the unique key on Date that the upsert conflicts on
+    df.head(0).to_sql(table_name, conn, if_exists="replace" if replace else "append", index=True)
+    if not replace:
+        # New columns (e.g. a newly added crypto token) are added to the existing table
+        existing = {c["name"] for c in inspect(conn).get_columns(table_name)}
+        for column in df.columns:
+            if column not in existing:
+                sql_type = "DOUBLE PRECISION" if is_numeric_dtype(df[column]) else "TEXT"
+                conn.exec_driver_sql(f"ALTER TABLE {quote(table_name)} ADD COLUMN {quote(column)} {sql_type}")
+    index_name = quote(f"{table_name}_date_key")
+    conn.exec_driver_sql(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {quote(table_name)} ({quote(df.index.name)})")
+
+
+def copy_upsert(df, table_name, engine, replace=False, conn=None):
+    # Streams df through COPY FROM STDIN into a temp staging table and merges it into
+    # table_name with INSERT ... ON CONFLICT ("Date") DO UPDATE. replace=True recreates the table.
+    # Pass conn to run inside an existing transaction. Returns the number of rows written.
+    df = _prepare(df)
+    if conn is None:
+        with engine.begin() as conn:
+            return copy_upsert(df, table_name, engine, replace=replace, conn=conn)
+    _ensure_table(conn, df, table_name, replace)
+    if df.empty:
+        return 0
+    key = df.index.name
+    columns = [key] + list(df.columns)
+    column_list = ", ".join(quote(c) for c in columns)
+    cursor = conn.connection.cursor()
+    try:
+        if replace:
+            # Fresh table: nothing to merge with, so COPY straight in
+            cursor.copy_expert(f"COPY {quote(table_name)} ({column_list}) FROM STDIN WITH (FORMAT csv)", _to_csv_buffer(df))
+        else:
+            stage = quote(f"stage_{table_name}")
+            cursor.execute(f"CREATE TEMP TABLE {stage} (LIKE {quote(table_name)} INCLUDING DEFAULTS) ON COMMIT DROP")
+            cursor.copy_expert(f"COPY {stage} ({column_list}) FROM STDIN WITH (FORMAT csv)", _to_csv_buffer(df))
+            updates = ", ".join(f"{quote(c)} = EXCLUDED.{quote(c)}" for c in df.columns)
+            conflict = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+            cursor.execute(
+                f"INSERT INTO {quote(table_name)} ({column_list}) SELECT {column_list} FROM {stage} "
+                f"ON CONFLICT ({quote(key)}) {conflict}"
+            )
+    finally:
+        cursor.close()
+    return len(df)
+
+
+def to_sql_load(df, table_name, engine, replace=False):
+    # The previous row-by-row INSERT path, kept for comparison in benchmarks/bench_loader.py
+    df.to_sql(table_name, engine, if_exists="replace" if replace else "append", index=True)
+    return len(df)
+
+
+def _normalize(df):
+    # Put fetched and stored frames on the same footing (ns dates, float numerics) so equal rows hash equally
+    df = df.copy()
+    df.index = pd.DatetimeIndex(df.index).as_unit("ns")
+    df.index.name = KEY
+    for column in df.columns:
+        if is_numeric_dtype(df[column]) or df[column].isna().all():
+            df[column] = df[column].astype("float64")
+    return df
+
+
+def row_hashes(df):
+    # One 64-bit fingerprint per row, covering the values but not the date
+    return pd.util.hash_pandas_object(df, index=False, categorize=False)
+
+
+def content_hash(df):
+    # Fingerprint of a whole frame, dates included
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=True, categorize=False).to_numpy().tobytes()).hexdigest()
+
+
+def read_window(table_name, con, start):
+    # Stored rows on or after start
+    query = f"SELECT * FROM {quote(table_name)} WHERE {quote(KEY)} >= %(start)s"
+    return pd.read_sql(query, con, params={"start": pd.Timestamp(start).to_pydatetime()}, index_col=KEY, parse_dates=[KEY])
+
+
+def diff_rows(new, stored):
+    # Splits new into rows missing from stored and rows whose values differ; returns those plus the unchanged count
+    new = _normalize(_prepare(new))
+    stored = _normalize(stored.reindex(columns=new.columns))
+    stored = stored[~stored.index.duplicated(keep="last")]
+    common = new.index.intersection(stored.index)
+    inserted = new.loc[new.index.difference(stored.index)]
+    changed_mask = row_hashes(new.loc[common]).to_numpy() != row_hashes(stored.loc[common]).to_numpy()
+    updated = new.loc[common[changed_mask]]
+    return inserted, updated, len(common) - len(updated)
+
+
+def write_diff(df, table_name, engine, watermark, lookback, conn):
+    # Compares the freshly fetched rows with what is stored inside the lookback window and
+    # writes only inserted or changed rows. Returns the rows written and their counts.
+    if watermark is None:
+        written = _prepare(df)
+        copy_upsert(written, table_name, engine, conn=conn)
+        return written, {"inserted": len(written), "updated": 0, "unchanged": 0}
+    window_start = watermark - lookback
+    # Sources that rewrite older history (e.g. a token backfill) mark where their changes start
+    if df.attrs.get("diff_start") is not None:
+        window_start = min(window_start, pd.Timestamp(df.attrs["diff_start"]))
+    new = df[df.index >= window_start]
+    stored = read_window(table_name, conn, window_start)
+    # Whole window identical: nothing to do for this table
+    if set(stored.columns) == set(new.columns) and len(stored) == len(new):
+        if content_hash(_normalize(_prepare(new))) == content_hash(_normalize(stored[new.columns])):
+            return new.iloc[0:0], {"inserted": 0, "updated": 0, "unchanged": len(new)}
+    inserted, updated, unchanged = diff_rows(new, stored)
+    changes = pd.concat([inserted, updated]).sort_index()
+    if not changes.empty:
+        copy_upsert(changes, table_name, engine, conn=conn)
+    return changes, {"inserted": len(inserted), "updated": len(updated), "unchanged": unchanged}
+
+
+def write_tables(all_data, engine, catalog=None, run_id=None, initial=False, lookback=pd.Timedelta(0), deadline=None):
+    # Loads every frame in all_data. Incremental runs diff each frame against the stored rows
+    # inside the revision lookback window so revised values are rewritten along with new ones.
+    # Each table's write and its etl_watermarks entry commit in the same transaction, so with a
+    # deadline every table written before it is kept and the rest are left out of stats.
+    catalog = catalog if catalog is not None else {}
+    watermarks = watermarks_from(catalog)
+    stats = {}
+    for table_name, df in all_data.items():
+        if deadline is not None and deadline.expired():
+            logging.warning(f"Deadline reached, not loading: {', '.join(t for t in all_data if t not in stats)}")
+            break
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            # If --initial argument is used, create new tables in database
+            if initial:
+                written = _prepare(df)
+                copy_upsert(written, table_name, engine, replace=True, conn=conn)
+                counts = {"inserted": len(written), "updated": 0, "unchanged": 0}
+            else:
+                written, counts = write_diff(df, table_name, engine, watermarks.get(table_name), lookback, conn)
+            if initial or not written.empty:
+                catalog[table_name] = update_entry(
+                    conn, table_name, catalog.get(table_name), written, counts["inserted"], run_id,
+                    content_hash(_normalize(written)), replace=initial,
+                )
+        # changed_from is the earliest written date, where tables derived from this one need recomputing
+        changed_from = written.index.min() if not written.empty else None
+        stats[table_name] = {**counts, "seconds": time.perf_counter() - started, "changed_from": changed_from}
+        if initial:
+            logging.info(f"Table '{table_name}' created.")
+        elif counts["inserted"] or counts["updated"]:
+            logging.info(f"'{table_name}': {counts['inserted']} inserted, {counts['updated']} updated, {counts['unchanged']} unchanged.")
+        else:
+            logging.info(f"No new data for '{table_name}'.")
+    return stats
@@ -0,0 +1,252 @@
+import json
+import logging
+import threading
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from sqlalchemy import inspect, text
+
+
+# Structured per-source and per-table run metrics. Each source task binds a SourceMetrics to the
+# current context; the HTTP clients add download/parse time, bytes, retries and cache hits to it.
+METRICS_FILE = "macro_etl_metrics.jsonl"
+RUNS_TABLE = "etl_runs"
+RUN_SOURCES_TABLE = "etl_run_sources"
+
+CREATE_RUNS = f"""
+CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+    run_id TEXT PRIMARY KEY,
+    started_at TIMESTAMPTZ NOT NULL,
+    finished_at TIMESTAMPTZ NOT NULL,
+    initial BOOLEAN NOT NULL,
+    wall_seconds DOUBLE PRECISION,
+    fetch_seconds DOUBLE PRECISION,
+    load_seconds DOUBLE PRECISION,
+    sources INTEGER,
+    failed INTEGER,
+    bytes BIGINT,
+    rows_written BIGINT
+)
+"""
+
+CREATE_RUN_SOURCES = f"""
+CREATE TABLE IF NOT EXISTS {RUN_SOURCES_TABLE} (
+    run_id TEXT NOT NULL REFERENCES {RUNS_TABLE} (run_id) ON DELETE CASCADE,
+    source TEXT NOT NULL,
+    seconds DOUBLE PRECISION,
+    wait_seconds DOUBLE PRECISION,
+    throttle_seconds DOUBLE PRECISION,
+    download_seconds DOUBLE PRECISION,
+    parse_seconds DOUBLE PRECISION,
+    transform_seconds DOUBLE PRECISION,
+    load_seconds DOUBLE PRECISION,
+    requests INTEGER,
+    retries INTEGER,
+    bytes BIGINT,
+    cache_hits INTEGER,
+    cache_misses INTEGER,
+    rows BIGINT,
+    rows_written BIGINT,
+    tables JSONB,
+    error TEXT,
+    status TEXT,
+    PRIMARY KEY (run_id, source)
+)
+"""
+
+INSERT_RUN = text(f"""
+INSERT INTO {RUNS_TABLE} (run_id, started_at, finished_at, initial, wall_seconds, fetch_seconds, load_seconds,
+                          sources, failed, bytes, rows_written)
+VALUES (:run_id, :started_at, :finished_at, :initial, :wall_seconds, :fetch_seconds, :load_seconds,
+        :sources, :failed, :bytes, :rows_written)
+""")
+
+INSERT_RUN_SOURCE = text(f"""
+INSERT INTO {RUN_SOURCES_TABLE} (run_id, source, seconds, wait_seconds, throttle_seconds, download_seconds,
+                                 parse_seconds, transform_seconds, load_seconds, requests, retries, bytes,
+                                 cache_hits, cache_misses, rows, rows_written, tables, error, status)
+VALUES (:run_id, :source, :seconds, :wait_seconds, :throttle_seconds, :download_seconds,
+        :parse_seconds, :transform_seconds, :load_seconds, :requests, :retries, :bytes,
+        :cache_hits, :cache_misses, :rows, :rows_written, CAST(:tables AS JSONB), :error, :status)
+""")
+
+PHASES = ("throttle", "download", "parse")
+COUNTERS = ("requests", "retries", "bytes", "cache_hits", "cache_misses")
+
+
+@dataclass
+class SourceMetrics:
+    # Phase seconds are summed over every request, so concurrent downloads can add up to more than wall time
+    source: str
+    phases: dict = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    counters: dict = field(default_factory=lambda: dict.fromkeys(COUNTERS, 0))
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add_time(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def count(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + n
+
+
+_current = ContextVar("etl_source_metrics", default=None)
+
+
+def current():
+    # Metrics of the source task running in this context, or None outside a source
+    return _current.get()
+
+
+def bind(source_metrics):
+    return _current.set(source_metrics)
+
+
+def unbind(token):
+    _current.reset(token)
+
+
+def count(counter, n=1):
+    source_metrics = _current.get()
+    if source_metrics is not None:
+        source_metrics.count(counter, n)
+
+
+def add_time(phase, seconds):
+    source_metrics = _current.get()
+    if source_metrics is not None:
+        source_metrics.add_time(phase, seconds)
+
+
+@contextmanager
+def timed(phase):
+    # Adds the time spent in the block to the current source's phase
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(phase, time.perf_counter() - start)
+
+
+def propagate(func):
+    # Thread pools don't inherit context variables: wrap tasks so they run in (a copy of) the submitting
+    # source's context and report to its metrics and deadline
+    context = copy_context()
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+
+def record_response(response):
+    # Bytes, retries and request count from a completed requests.Response
+    retries = getattr(getattr(response.raw, "retries", None), "history", None) or ()
+    count("requests")
+    count("retries", len(retries))
+    count("bytes", len(response.content))
+
+
+def build_run(run_id, started_at, initial, results, load_stats, fetch_seconds, load_seconds):
+    # Collects the run, per-source and per-table records from the fetch results and loader stats
+    source_rows = []
+    table_rows = []
+    for result in results:
+        m = result.metrics or SourceMetrics(result.name)
+        tables = {}
+        for table_name, df in result.tables.items():
+            stats = load_stats.get(table_name, {})
+            tables[table_name] = {
+                "rows": len(df),
+                "inserted": stats.get("inserted", 0),
+                "updated": stats.get("updated", 0),
+                "unchanged": stats.get("unchanged", 0),
+                "load_seconds": round(stats.get("seconds", 0.0), 4),
+            }
+            table_rows.append({"run_id": run_id, "table_name": table_name, "source": result.name, **tables[table_name]})
+        busy = sum(m.phases.get(p, 0.0) for p in PHASES)
+        source_rows.append({
+            "run_id": run_id,
+            "source": result.name,
+            "seconds": round(result.seconds, 4),
+            "wait_seconds": round(result.wait_seconds, 4),
+            **{f"{p}_seconds": round(m.phases.get(p, 0.0), 4) for p in PHASES},
+            # Whatever the task did outside throttling, downloading and parsing is transform work
+            "transform_seconds": round(max(0.0, result.seconds - busy), 4),
+            "load_seconds": round(sum((t["load_seconds"] for t in tables.values()), 0.0), 4),
+            **{c: int(m.counters.get(c, 0)) for c in COUNTERS},
+            "rows": sum(t["rows"] for t in tables.values()),
+            "rows_written": sum(t["inserted"] + t["updated"] for t in tables.values()),
+            "tables": tables,
+            "status": result.status,
+            "error": result.error,
+        })
+    finished_at = datetime.now(timezone.utc)
+    run = {
+        "run_id": run_id,
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "initial": bool(initial),
+        "wall_seconds": round((finished_at - started_at).total_seconds(), 4),
+        "fetch_seconds": round(fetch_seconds, 4),
+        "load_seconds": round(load_seconds, 4),
+        "sources": len(source_rows),
+        "failed": sum(1 for s in source_rows if s["status"] != "ok"),
+        "bytes": sum(s["bytes"] for s in source_rows),
+        "rows_written": sum(s["rows_written"] for s in source_rows),
+    }
+    return {"run": run, "sources": source_rows, "tables": table_rows}
+
+
+def recent_costs(engine, runs=5):
+    # Median seconds per source over its last few successful runs, for scheduling and time budgets
+    query = text(f"""
+        SELECT s.source, percentile_cont(0.5) WITHIN GROUP (ORDER BY s.seconds) AS seconds
+        FROM {RUN_SOURCES_TABLE} s
+        JOIN (SELECT run_id FROM {RUNS_TABLE} ORDER BY started_at DESC LIMIT :runs) r USING (run_id)
+        WHERE s.error IS NULL
+        GROUP BY s.source
+    """)
+    if not inspect(engine).has_table(RUN_SOURCES_TABLE):
+        return {}
+    with engine.connect() as conn:
+        return {row.source: float(row.seconds) for row in conn.execute(query, {"runs": runs})}
+
+
+def write_jsonl(record, path=METRICS_FILE):
+    # One line for the run, one per source and one per table, all tagged with the run id
+    lines = [{"kind": "run", **record["run"]}]
+    lines += [{"kind": "source", **{k: v for k, v in s.items() if k != "tables"}} for s in record["sources"]]
+    lines += [{"kind": "table", **t} for t in record["tables"]]
+    with open(path, "a") as f:
+        for line in lines:
+            f.write(json.dumps(line, default=str) + "\n")
+
+
+def save_run(engine, record):
+    # Appends the run to etl_runs / etl_run_sources in one transaction
+    with engine.begin() as conn:
+        conn.exec_driver_sql(CREATE_RUNS)
+        conn.exec_driver_sql(CREATE_RUN_SOURCES)
+        conn.execute(INSERT_RUN, record["run"])
+        if record["sources"]:
+            conn.execute(INSERT_RUN_SOURCE, [{**s, "tables": json.dumps(s["tables"])} for s in record["sources"]])
+
+
+def publish(engine, record, path=METRICS_FILE):
+    # Metrics must never fail the ETL itself
+    try:
+        write_jsonl(record, path)
+    except OSError as e:
+        logging.error(f"Error occurred while writing run metrics to {path}: {e}")
+    try:
+        save_run(engine, record)
+    except Exception as e:
+        logging.error(f"Error occurred while saving run metrics to {RUNS_TABLE}: {e}")
+    run = record["run"]
+    logging.info(
+        f"Run {run['run_id']}: fetch {run['fetch_seconds']:.2f}s, load {run['load_seconds']:.2f}s, "
+        f"{run['bytes'] / 1e6:.1f} MB downloaded, {run['rows_written']} rows written."
+    )
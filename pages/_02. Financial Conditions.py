@@ -1,15 +1,13 @@
 import os
 import pandas as pd
 import streamlit as st
-from helper import load_table, plot_datasets, plot_with_constant, basic_plot
+from helper import load_tables, plot_datasets, plot_with_constant, basic_plot
 
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
 # Read data sources
-ism = load_table("ism")
-financial_conditions = load_table("financial_conditions")
-fci = load_table("fed_fci")
+ism, financial_conditions, fci = load_tables(["ism", "financial_conditions", "fed_fci"]).values()
 fci_start_date = "2000-01-01"
 # Add in ISM YoY%
 ism["ISM YoY%"] = ism["ISM"].pct_change(periods=12) * 100
@@ -3,14 +3,16 @@ import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from helper import load_table, plot_datasets, plot_with_constant
+from helper import load_tables, plot_datasets, plot_with_constant, scatter
 
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
 # Read data sources
-tables = ["ism", "nasdaq", "monthly_data", "quarterly_data", "global_m2", "crypto", "economic_data", "gold", "shiller_data", "fed_liquidity", "financial_conditions"]
-data = {name: load_table(name) for name in tables}
+tables = ["ism", "nasdaq", "monthly_data", "quarterly_data", "global_m2", "crypto", "economic_data", "gold", "shiller_data", "fed_liquidity", "financial_conditions",
+          "global_m2_yoy", "domestic_liquidity", "credit_impulse", "fed_liquidity_yoy"]
+columns = {"monthly_data": ["US M2", "Case-Shiller Home Price Index"], "quarterly_data": ["US GDP"]}
+data = load_tables(tables, columns=columns)
 
 
 # Split the container into columns to manage content
@@ -37,11 +39,10 @@ with col2:
     st.write("""This first chart shows how the level of liquidity is correlated with the Nasdaq Index. Here liquidity is represented by global M2, which is an aggregated measure of the broad money supply from multiple countries, 
                 typically including the world's largest economies. It represents the total amount of money circulating in the global financial system, encompassing cash, checking deposits, savings deposits, and other near-money assets 
                 (like money market funds and short-term time deposits). Global is used instead of domestic liquidity because investors around the world buy US assets, so in a sense this makes it a global asset class.""")
-    data["global_m2"]["Global M2 YoY%"] = data["global_m2"]["Global M2"].pct_change(periods=52, fill_method=None) * 100
     # Chart coded manually here instead of using function to add log scale to Nasdaq series
     fig1 = make_subplots(specs=[[{"secondary_y": True}]])
-    fig1.add_trace(go.Scatter(x=data["global_m2"].index, y=data["global_m2"]["Global M2"], name="Global M2"), secondary_y=False)
-    fig1.add_trace(go.Scatter(x=data["nasdaq"].loc[data["nasdaq"].index > data["global_m2"].index[0]].index, y=data["nasdaq"]["Nasdaq"].loc[data["nasdaq"].index > data["global_m2"].index[0]], name="Nasdaq", line=dict(color="orange")), secondary_y=True)
+    fig1.add_trace(scatter(data["global_m2"]["Global M2"], name="Global M2"), secondary_y=False)
+    fig1.add_trace(scatter(data["nasdaq"]["Nasdaq"].loc[data["nasdaq"].index > data["global_m2"].index[0]], name="Nasdaq", line=dict(color="orange")), secondary_y=True)
     fig1.update_yaxes(title_text="Global M2", secondary_y=False, range=[0.53e14, 1.17e14])
     fig1.update_yaxes(title_text="Nasdaq", secondary_y=True, type="log") # Added log scale here
     fig1.update_layout(width=1000, height=600, legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5), margin=dict(t=10, b=20, l=20, r=20))
@@ -57,7 +58,7 @@ with col2:
                 highlighting this relationship. Of course, gold also hedges uncertainty and can be a flight-to-safety asset during times of major transition or turmoil, so the YoY correlation won't always be perfect, but over the long 
                 term we should expect gold to track the money supply.""")
     data["gold"]["Gold YoY%"] = data["gold"]["Gold Price"].pct_change(periods=52, fill_method=None) * 100
-    fig2 = plot_datasets(primary_df=data["global_m2"], secondary_df=data["gold"], primary_series="Global M2 YoY%", secondary_series="Gold YoY%", start_date="2014-05-01", primary_range=[-10, 27], secondary_range=[-25, 60])
+    fig2 = plot_datasets(primary_df=data["global_m2_yoy"], secondary_df=data["gold"], primary_series="Global M2 YoY%", secondary_series="Gold YoY%", start_date="2014-05-01", primary_range=[-10, 27], secondary_range=[-25, 60])
     st.plotly_chart(fig2, use_container_width=False)
     st.markdown("<h6 style='text-align: center;'>Figure 2: Global M2 YoY vs Gold YoY</h6>", unsafe_allow_html=True)
     st.markdown("<br><br>", unsafe_allow_html=True)
@@ -85,8 +86,8 @@ with col2:
                 If this trend continues, we may see fewer speculative bubbles and a more stable correlation between Bitcoin and the money supply.""")
     # Chart coded manually here instead of using function to add log scale
     fig4 = make_subplots(specs=[[{"secondary_y": True}]])
-    fig4.add_trace(go.Scatter(x=data["global_m2"].index, y=data["global_m2"]["Global M2"], name="Global M2"), secondary_y=False)
-    fig4.add_trace(go.Scatter(x=data["crypto"].index, y=data["crypto"]["BTC"], name="BTC", line=dict(color="orange")), secondary_y=True)
+    fig4.add_trace(scatter(data["global_m2"]["Global M2"], name="Global M2"), secondary_y=False)
+    fig4.add_trace(scatter(data["crypto"]["BTC"], name="BTC", line=dict(color="orange")), secondary_y=True)
     fig4.update_yaxes(title_text="Global M2", secondary_y=False, range=[0.5e14, 1.17e14])
     fig4.update_yaxes(title_text="BTC Price", secondary_y=True, type="log")
     fig4.update_layout(width=1000, height=600, legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5), margin=dict(t=10, b=20, l=20, r=20))
@@ -100,9 +101,8 @@ with col2:
     st.write("""Here is the same relationship one more time but tracking the YoY% returns of each dataset.""")
     data["crypto"] = data["crypto"].resample("W").mean()
     data["crypto"]["BTC YoY%"] = data["crypto"]["BTC"].pct_change(periods=52, fill_method=None) * 100
-    data["global_m2"]["Global M2 YoY%"] = data["global_m2"]["Global M2"].pct_change(periods=52, fill_method=None) * 100 
     # Create and show the plot
-    fig5 = plot_datasets(primary_df=data["global_m2"], secondary_df=data["crypto"], primary_series="Global M2 YoY%", secondary_series="BTC YoY%", start_date="2014-05-20", primary_range=[-4, 30], secondary_range=[-100, 1000])
+    fig5 = plot_datasets(primary_df=data["global_m2_yoy"], secondary_df=data["crypto"], primary_series="Global M2 YoY%", secondary_series="BTC YoY%", start_date="2014-05-20", primary_range=[-4, 30], secondary_range=[-100, 1000])
     st.plotly_chart(fig5, use_container_width=False)
     st.markdown("<h6 style='text-align: center;'>Figure 5: Global M2 YoY vs Bitcoin YoY</h6>", unsafe_allow_html=True)
     st.markdown("<br><br>", unsafe_allow_html=True)
@@ -133,13 +133,8 @@ with col2:
                 signals tightening liquidity conditions. Conversely, a steep yield curve (positive spread) usually aligns with expanding liquidity, reflecting looser monetary policy and stronger growth expectations. While the yield curve 
                 often leads liquidity changes by several months, especially during downturns, rapid policy shifts or market disruptions can temporarily weaken this relationship. So, while we should avoid relying too heavily on this 
                 correlation to predict future trends, it does have some value under the right circumstances. In this chart domestic liquidity for the US is the sum of M2 and the Fed's balance sheet.""")
-    # Create df to calculate YoY change in Domestic Liquidity
-    fed = data["fed_liquidity"][["Fed Net Liquidity"]].copy()
-    fed = fed.resample("ME").mean()
-    fed["M2"] = data["monthly_data"][["US M2"]]
-    fed["Total Liquidity"] = fed["M2"] + fed["Fed Net Liquidity"]
-    fed["Liquidity YoY%"] = fed["Total Liquidity"].pct_change(periods=12, fill_method=None) * 100
-    fig7 = plot_datasets(primary_df=fed, secondary_df=data["financial_conditions"], primary_series="Liquidity YoY%", secondary_series="Yield Curve", start_date="2012-01-01", primary_range=[-9, 35], secondary_range=[-1.3, 5.5])
+    # YoY change in Domestic Liquidity (monthly Fed Net Liquidity + M2)
+    fig7 = plot_datasets(primary_df=data["domestic_liquidity"], secondary_df=data["financial_conditions"], primary_series="Liquidity YoY%", secondary_series="Yield Curve", start_date="2012-01-01", primary_range=[-9, 35], secondary_range=[-1.3, 5.5])
     st.plotly_chart(fig7, use_container_width=False)
     st.markdown("<h6 style='text-align: center;'>Figure 7: Yield Curve vs Domestic Liquidity YoY%</h6>", unsafe_allow_html=True)
     st.markdown("<br><br>", unsafe_allow_html=True)
@@ -160,10 +155,8 @@ with col2:
                 of robust credit growth tend to coincide with stronger labor markets, while contractions in private credit are often associated with rising joblessness. This dynamic underscores the role of credit availability in 
                 supporting economic activity and employment. The covid spike in unemployment is a unique exception, as you would expect, given that the rise in unemployment was caused by an exogenous shock rather than any change in credit
                 creation. Therefore, it's fair to ignore this anomaly when analyzing this relationship.""")
-    # Calculate change in private credit/GDP
-    private_credit = data["quarterly_data"][["Total Private Credit", "US GDP"]].copy()
-    private_credit["Change in Credit"] = private_credit["Total Private Credit"].diff(4)
-    private_credit["Credit Change % GDP"] = (private_credit["Change in Credit"]/private_credit["US GDP"]) * 100
+    # Change in private credit/GDP
+    private_credit = data["credit_impulse"]
     fig8 = plot_datasets(primary_df=data["economic_data"][["Unemployment"]] * -1, secondary_df=private_credit, primary_series="Unemployment", secondary_series="Credit Change % GDP", start_date=data["economic_data"][["Unemployment"]].index[0], primary_range=[-17, -3], secondary_range=[-10, 25])
     st.plotly_chart(fig8, use_container_width=False)
     st.markdown("<h6 style='text-align: center;'>Figure 8: Change in Private Credit as % of GDP vs Unemployment</h6>", unsafe_allow_html=True)
@@ -176,11 +169,7 @@ with col2:
                 in credit momentum and business cycle dynamics. The credit impulse measures the acceleration or deceleration of new credit creation over a 6 month period, making it a leading indicator of economic activity in most economic 
                 conditions. The chart reveals a strong correlation between credit impulse and the ISM, indicating that shifts in credit growth often precede changes in manufacturing sentiment. This relationship underscores how the 
                 pace of new credit issuance can significantly influence business conditions and economic confidence. The data is a smoothed moving average in order to remove some of the noise common to these credit impulse charts.""")
-    # Calculate credit impulse
-    private_credit["6 Month Credit Change"] = private_credit["Total Private Credit"].diff(2)
-    private_credit["6 Month Flow Change"] = private_credit["6 Month Credit Change"].diff(2)
-    private_credit["Credit Impulse/GDP"] = (private_credit["6 Month Flow Change"] / private_credit["US GDP"])*100
-    private_credit["Credit Impulse Smoothed"] = private_credit["Credit Impulse/GDP"].rolling(window=6, center=False).mean()
+    # Credit impulse
     fig9 = plot_datasets(primary_df=data["ism"], secondary_df=private_credit, primary_series="ISM", secondary_series="Credit Impulse Smoothed", start_date="1991-01-01", primary_range=[30, 70], secondary_range=[-2.6, 2.2])
     st.plotly_chart(fig9, use_container_width=False)
     st.markdown("<h6 style='text-align: center;'>Figure 9: Credit Impulse (Smoothed) / GDP vs ISM PMI</h6>", unsafe_allow_html=True)
@@ -194,12 +183,7 @@ with col2:
                 prices. Conversely, when the credit impulse slows or turns negative, housing price growth often moderates or declines. The chart demonstrates a clear correlation, indicating that shifts in mortgage credit momentum can 
                 act as a leading indicator for movements in housing prices.""")
     # Mortgage Credit
-    mortgages = data["quarterly_data"][["Total Mortgage Debt", "US GDP"]].copy()
-    mortgages["Total Mortgage Debt"] = mortgages["Total Mortgage Debt"] / 1000 # Convert to billions
-    mortgages["Credit Change"] = mortgages["Total Mortgage Debt"].diff(2)
-    mortgages["Rate of Change"] = mortgages["Credit Change"].diff(3)
-    mortgages["Credit Impulse/GDP"] = (mortgages["Rate of Change"]/mortgages["US GDP"]) * 100
-    mortgages["Credit Impulse Smoothed"] = mortgages["Credit Impulse/GDP"].rolling(window=4, center=False).mean()
+    mortgages = data["credit_impulse"][["Mortgage Credit Impulse Smoothed"]].rename(columns={"Mortgage Credit Impulse Smoothed": "Credit Impulse Smoothed"})
     # Case-Shiller Home Prices
     data["monthly_data"]["Houses YoY%"] = data["monthly_data"]["Case-Shiller Home Price Index"].pct_change(periods=12, fill_method=None) * 100
     fig10 = plot_datasets(primary_df=mortgages, secondary_df=data["monthly_data"], primary_series="Credit Impulse Smoothed", secondary_series="Houses YoY%", start_date="1988-01-01", primary_range=[-2.8, 2.2], secondary_range=[-17, 25])
@@ -217,7 +201,7 @@ with col2:
     # 11. Global M2 Weekly YoY
     st.markdown("<h4 style='text-align: left;'>Global M2 YoY%</h4>", unsafe_allow_html=True)
     st.write("""Here we have year-over-year changes in global M2 again but with weekly data to give a more granular outlook, and a dashed horizontal line at the zero level to better see when global M2 is expanding or contracting YoY.""")
-    fig11 = plot_with_constant(df=data["global_m2"], series_name="Global M2 YoY%", constant_y=0, start_date="2014-05-01", series_range=[-20, 30])
+    fig11 = plot_with_constant(df=data["global_m2_yoy"], series_name="Global M2 YoY%", constant_y=0, start_date="2014-05-01", series_range=[-20, 30])
     st.plotly_chart(fig11, use_container_width=False)
     st.markdown("<h6 style='text-align: center;'>Figure 11: Global M2 YoY% (Weekly)</h6>", unsafe_allow_html=True)
     st.markdown("<br><br>", unsafe_allow_html=True)
@@ -228,9 +212,7 @@ with col2:
     st.write("""The chart below shows Fed Net Liquidity, calculated as the Fed's Balance Sheet minus the Treasury General Account (TGA) and the Reverse Repo (RRP) facility. The TGA is the account where the Federal Government holds its 
                 funds at the Fed after collecting taxes or issuing bonds. When the government spends from the TGA, it releases liquidity into the economy, thereby increasing M2. In contrast, the RRP facility is a tool used by the Fed 
                 to absorb excess liquidity from money markets by offering a rate of return, effectively reducing the money supply available for lending and investment.""")
-    # Calculate YoY change in Fed Net Liquidity
-    fed_liquidity = data["fed_liquidity"][["Fed Net Liquidity"]].copy()
-    fed_liquidity["Fed Liquidity YoY%"] = fed_liquidity["Fed Net Liquidity"].pct_change(periods=52) * 100
-    fig12 = plot_with_constant(df=fed_liquidity, series_name="Fed Liquidity YoY%", constant_y=0, start_date="2011-01-01", series_range=[-20, 75])
+    # YoY change in Fed Net Liquidity
+    fig12 = plot_with_constant(df=data["fed_liquidity_yoy"], series_name="Fed Liquidity YoY%", constant_y=0, start_date="2011-01-01", series_range=[-20, 75])
     st.plotly_chart(fig12, use_container_width=False)
     st.markdown("<h6 style='text-align: center;'>Figure 12: Fed Net Liquidity YoY%</h6>", unsafe_allow_html=True)
\ No newline at end of file
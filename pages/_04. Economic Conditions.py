@@ -1,16 +1,14 @@
 import os
 import pandas as pd
 import streamlit as st
-from helper import load_table, plot_datasets, plot_with_constant, basic_plot
+from helper import load_tables, plot_datasets, plot_with_constant, basic_plot
 
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
-# Read Economic data
-economic_df = load_table("economic_data")
+# Read Economic and Quarterly data
+economic_df, quarterly = load_tables(["economic_data", "quarterly_data"], columns={"quarterly_data": ["US GDP", "Real GDP"]}).values()
 economy_start_date = "1990-01-01"
-# Quarterly data
-quarterly = load_table("quarterly_data")
 
 
 # Split the container into columns to manage content
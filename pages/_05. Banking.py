@@ -3,18 +3,16 @@ import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 
-from helper import load_table, plot_with_constant, basic_plot
+from helper import load_tables, plot_with_constant, basic_plot
 
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
 # Read data source
-banking = load_table("banking")
+banking, banking_yoy, quarterly_data = load_tables(["banking", "banking_yoy", "quarterly_data"]).values()
 banking_start_date = "2000-01-01"
-quarterly_data = load_table("quarterly_data")
-# Loop through column to make YoY% for each
-for col in banking.columns:
-    banking[col + ' YoY%'] = banking[col].pct_change(periods=12, fill_method=None) * 100
+# YoY% for each column
+banking = banking.join(banking_yoy)
 
 
 # Split the container into columns to manage content
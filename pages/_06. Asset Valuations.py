@@ -3,14 +3,14 @@ import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from helper import load_table, plot_datasets, plot_with_constant, basic_plot
+from helper import load_tables, plot_datasets, plot_with_constant, basic_plot, scatter
 
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
 # Read data sources
-tables = ["shiller_data", "gold", "nasdaq", "monthly_data", "quarterly_data", "european_indices", "economic_data"]
-data = {name: load_table(name) for name in tables}
+tables = ["shiller_data", "gold", "nasdaq", "monthly_data", "european_indices", "economic_data"]
+data = load_tables(tables, columns={"monthly_data": ["US M2", "Case-Shiller Home Price Index", "New Homes for Sale"]})
 
 
 # Split the container into columns to manage content
@@ -98,9 +98,9 @@ with col2:
     for col in data["european_indices"].columns:
         data["european_indices"][col + ' Normalized'] = data["european_indices"][col] / data["european_indices"][col].iloc[0]
     fig6 = make_subplots(specs=[[{"secondary_y": True}]])
-    fig6.add_trace(go.Scatter(x=data["european_indices"].index, y=data["european_indices"]["Nasdaq Normalized"], name="Nasdaq Normalized"), secondary_y=False)
-    fig6.add_trace(go.Scatter(x=data["european_indices"].index, y=data["european_indices"]["DAX Normalized"], name="DAX Normalized", line=dict(color="orange")), secondary_y=False)
-    fig6.add_trace(go.Scatter(x=data["european_indices"].index, y=data["european_indices"]["CAC40 Normalized"], name="CAC40 Normalized", line=dict(color="green")), secondary_y=False)
+    fig6.add_trace(scatter(data["european_indices"]["Nasdaq Normalized"], name="Nasdaq Normalized"), secondary_y=False)
+    fig6.add_trace(scatter(data["european_indices"]["DAX Normalized"], name="DAX Normalized", line=dict(color="orange")), secondary_y=False)
+    fig6.add_trace(scatter(data["european_indices"]["CAC40 Normalized"], name="CAC40 Normalized", line=dict(color="green")), secondary_y=False)
     fig6.update_layout(width=1000, height=600, legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center",x=0.5), margin=dict(t=10, b=20, l=20, r=20))
     st.plotly_chart(fig6, use_container_width=False)
     st.markdown("<h6 style='text-align: center;'>Figure 6: Nasdaq vs DAX vs CAC40, Normalized at 01/01/2000</h6>", unsafe_allow_html=True)
@@ -3,18 +3,14 @@ import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 
-from helper import load_table, plot_datasets, plot_with_constant
+from helper import load_tables, plot_datasets, plot_with_constant
 
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
-# Inflation data
-inflation = load_table("inflation")
-inflation["CPI YoY%"] = inflation["Consumer Price Index"].pct_change(periods=12) * 100
-inflation["PPI YoY%"] = inflation["Producer Price Index"].pct_change(periods=12, fill_method=None) * 100
-inflation = inflation.dropna()
-# Supply Chain Index
-gscpi = load_table("fed_supply_chain")
+# Inflation and Supply Chain Index data
+inflation, inflation_yoy, gscpi = load_tables(["inflation", "inflation_yoy", "fed_supply_chain"]).values()
+inflation = inflation.join(inflation_yoy).dropna()
 
 
 # Split the container into columns to manage content
@@ -1,14 +1,14 @@
 import os
 import pandas as pd
 import streamlit as st
-from helper import load_table, plot_datasets, basic_plot
+from helper import load_tables, plot_datasets, basic_plot
 
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
 # Read datasets
 tables = ["government_spending", "quarterly_data", "economic_data", "annual_data"]
-data = {name: load_table(name) for name in tables}
+data = load_tables(tables)
 
 # Start date
 govt_start_date = "1980-01-01"
@@ -1,14 +1,14 @@
 import os
 import pandas as pd
 import streamlit as st
-from helper import load_table, plot_datasets, basic_plot, plot_with_constant
+from helper import load_tables, plot_datasets, basic_plot, plot_with_constant
 
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
 # Read datasets
 tables = ["rstar", "inflation", "interest_rates"]
-data = {name: load_table(name) for name in tables}
+data = load_tables(tables)
 
 
 # Split the container into columns to manage content
@@ -3,14 +3,14 @@ import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 
-from helper import load_table, plot_datasets, basic_plot
+from helper import load_tables, plot_datasets, basic_plot
 
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
 # Read data sources
 tables = ["financial_conditions", "debt_securities", "dollar_reserves", "quarterly_data", "nasdaq"]
-data = {name: load_table(name) for name in tables}
+data = load_tables(tables, columns={"quarterly_data": ["Current Account", "US GDP"]})
 
 
 # Split the container into columns to manage content
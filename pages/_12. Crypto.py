@@ -8,14 +8,8 @@ from helper import load_table, basic_plot
 # Set the page layout
 st.set_page_config(page_title="Macro App", layout="wide")
 
-# Read crypto data
-crypto = load_table("crypto")
-
-# Create ratios
-crypto["ETH/BTC"] = crypto["ETH"] / crypto["BTC"]
-crypto["SOL/BTC"] = crypto["SOL"] / crypto["BTC"]
-crypto["SOL/ETH"] = crypto["SOL"] / crypto["ETH"]
-crypto["SUI/SOL"] = crypto["SUI"] / crypto["SOL"]
+# Read the crypto ratios (computed by the ETL, see derived.py)
+crypto = load_table("crypto_ratios", start="2015-08-01")
 
 
 # Split the container into columns to manage content
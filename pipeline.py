@@ -0,0 +1,380 @@
+import deadlines
+import logging
+import metrics
+import os
+import pandas as pd
+import threading
+import time
+import uuid
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+
+# Thread pool size and per-host concurrency caps for the source tasks
+MAX_WORKERS = int(os.getenv("ETL_MAX_WORKERS", "8"))
+HOST_LIMITS = {
+    "fred": 4,
+    "yahoo": 1,      # yfinance keeps module-level state, so never download in parallel
+    "coingecko": 1,
+}
+DEFAULT_HOST_LIMIT = 2
+# Time budgets used when the run has a deadline (Lambda): a source gets BUDGET_FACTOR times its
+# expected cost, clamped to [MIN_SOURCE_BUDGET, MAX_SOURCE_BUDGET] seconds
+BUDGET_FACTOR = float(os.getenv("ETL_BUDGET_FACTOR", "3"))
+MIN_SOURCE_BUDGET = float(os.getenv("ETL_MIN_SOURCE_BUDGET", "20"))
+MAX_SOURCE_BUDGET = float(os.getenv("ETL_MAX_SOURCE_BUDGET", "180"))
+# A source isn't started with less than this left before the fetch deadline
+MIN_START_SECONDS = float(os.getenv("ETL_MIN_START_SECONDS", "5"))
+# Incremental runs refetch this many days before each table's watermark to pick up revisions
+REVISION_LOOKBACK_DAYS = int(os.getenv("ETL_REVISION_LOOKBACK_DAYS", "90"))
+
+
+@dataclass
+class RunContext:
+    # Shared state handed to every source task
+    initial: bool
+    today: Any
+    run_id: str = None
+    fred: Any = None
+    engine: Any = None
+    http_cache: Any = None
+    # Latest stored "Date" per table, read once at the start of an incremental run
+    watermarks: dict = field(default_factory=dict)
+    lookback: pd.Timedelta = field(default_factory=lambda: pd.Timedelta(days=REVISION_LOOKBACK_DAYS))
+    # Frames produced so far in this run, keyed by table name; a node reads its dependencies' outputs here
+    outputs: dict = field(default_factory=dict)
+
+    def upstream(self, table_name):
+        return self.outputs[table_name]
+
+    def observation_start(self, *tables, warmup=None):
+        # First date an incremental fetch needs for the given tables, or None for full history.
+        # warmup covers transforms that need extra history (resamples, YoY% changes).
+        if self.initial or not tables:
+            return None
+        marks = [self.watermarks.get(table) for table in tables]
+        if any(mark is None for mark in marks):
+            return None
+        start = min(marks) - self.lookback
+        if warmup is not None:
+            start = start - warmup
+        return start
+
+
+def new_run_id():
+    # Sortable, unique id for one ETL run, e.g. 20250101T060000Z-1a2b3c
+    return f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:6]}"
+
+
+@dataclass
+class Source:
+    # A registered node of the ETL graph: func(ctx) returns a dict of {table_name: DataFrame}.
+    # depends names the nodes (or tables) whose outputs it reads through ctx.upstream; load=False marks
+    # intermediate nodes whose frames feed other nodes but aren't written to the database.
+    # Lower priority numbers run first; cost is the expected run time in seconds when there's no history.
+    name: str
+    func: Callable
+    hosts: tuple = ()
+    tables: tuple = ()
+    priority: int = 2
+    cost: float = 10.0
+    depends: tuple = ()
+    load: bool = True
+
+    def budget(self, cost=None):
+        cost = self.cost if cost is None else cost
+        return min(MAX_SOURCE_BUDGET, max(MIN_SOURCE_BUDGET, BUDGET_FACTOR * cost))
+
+
+@dataclass
+class SourceResult:
+    name: str
+    tables: dict = field(default_factory=dict)
+    seconds: float = 0.0
+    wait_seconds: float = 0.0
+    # "ok", "failed", "timeout" (ran past its budget) or "skipped" (never started before the deadline)
+    status: str = "ok"
+    error: str = None
+    metrics: Any = None
+
+
+# Registered sources, kept in declaration order
+SOURCES = {}
+
+
+def source(name, hosts=(), tables=(), priority=2, cost=10.0, depends=(), load=True):
+    # Decorator that registers a function as a source task
+    if isinstance(hosts, str):
+        hosts = (hosts,)
+    if isinstance(tables, str):
+        tables = (tables,)
+    if isinstance(depends, str):
+        depends = (depends,)
+    def register(func):
+        SOURCES[name] = Source(name=name, func=func, hosts=tuple(hosts), tables=tuple(tables),
+                               priority=priority, cost=cost, depends=tuple(depends), load=load)
+        return func
+    return register
+
+
+def resolve(names, sources=None):
+    # Maps node or table names to node names
+    sources = SOURCES if sources is None else sources
+    by_table = {table: src.name for src in sources.values() for table in src.tables}
+    resolved = []
+    for name in names:
+        if name in sources:
+            resolved.append(name)
+        elif name in by_table:
+            resolved.append(by_table[name])
+        else:
+            raise ValueError(f"Unknown source or table: {name}")
+    return resolved
+
+
+def dependencies(sources=None):
+    # {node name: [node names it depends on]}, checked for unknown names and cycles
+    sources = SOURCES if sources is None else sources
+    graph = {name: resolve(src.depends, sources) for name, src in sources.items()}
+    visiting, done = set(), set()
+    def visit(name, path):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle: {' -> '.join(path + [name])}")
+        visiting.add(name)
+        for dep in graph[name]:
+            visit(dep, path + [name])
+        visiting.discard(name)
+        done.add(name)
+    for name in graph:
+        visit(name, [])
+    return graph
+
+
+def select_sources(only=None, skip=None, sources=None):
+    # The subgraph to run, in registration order: the `only` nodes/tables plus everything upstream of
+    # them (default: every node), minus the `skip` nodes/tables and everything downstream of those
+    sources = SOURCES if sources is None else sources
+    graph = dependencies(sources)
+    if only:
+        selected = set()
+        stack = resolve(only, sources)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack.extend(graph[name])
+    else:
+        selected = set(sources)
+    if skip:
+        removed = set(resolve(skip, sources))
+        changed = True
+        while changed:
+            downstream = {name for name in selected - removed if removed & set(graph[name])}
+            changed = bool(downstream)
+            removed |= downstream
+        selected -= removed
+    return [src for name, src in sources.items() if name in selected]
+
+
+def schedule(sources, costs=None):
+    # Most important first; within a priority the most expensive start first so they don't end up
+    # as the last task running when the deadline arrives
+    costs = costs or {}
+    return sorted(sources, key=lambda src: (src.priority, -costs.get(src.name, src.cost)))
+
+
+def source_tables(sources=None):
+    # Every table name loaded by the given (default: all registered) sources
+    sources = SOURCES.values() if sources is None else sources
+    return [table for src in sources if src.load for table in src.tables]
+
+
+class HostLimiter:
+    # Caps the number of in-flight tasks per host
+    def __init__(self, limits=None, default=DEFAULT_HOST_LIMIT):
+        self.limits = dict(HOST_LIMITS if limits is None else limits)
+        self.default = default
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.limits.get(host, self.default))
+            return self._semaphores[host]
+
+    def try_acquire(self, hosts):
+        # Takes a slot on every host without blocking; returns the semaphores held, or None (holding
+        # nothing) if any host is full. Sorted order keeps multi-host tasks consistent with each other.
+        acquired = []
+        for host in sorted(set(hosts)):
+            sem = self._semaphore(host)
+            if not sem.acquire(blocking=False):
+                self.release(acquired)
+                return None
+            acquired.append(sem)
+        return acquired
+
+    @staticmethod
+    def release(acquired):
+        for sem in reversed(acquired):
+            sem.release()
+
+
+def _run_source(src, ctx, limiter, acquired, queued, budget=None, fetch_deadline=None):
+    # Runs on a pool worker holding the source's host slots (taken by run_sources), which it releases.
+    # queued is when the source became ready to run, so wait_seconds is the time spent waiting for a slot.
+    result = SourceResult(name=src.name)
+    started = time.perf_counter()
+    result.wait_seconds = started - queued
+    deadline = None
+    if fetch_deadline is not None:
+        if fetch_deadline.remaining() < MIN_START_SECONDS:
+            limiter.release(acquired)
+            result.status, result.error = "skipped", "not enough time left to start"
+            return result
+        deadline = deadlines.Deadline(at=min(time.monotonic() + budget, fetch_deadline.at))
+    result.metrics = metrics.SourceMetrics(src.name)
+    metrics_token = metrics.bind(result.metrics)
+    deadline_token = deadlines.bind(deadline)
+    try:
+        result.tables = src.func(ctx) or {}
+        logging.info(f"{src.name} data fetched.")
+    except Exception as e:
+        # A request cut short by the budget surfaces as the client's own timeout error
+        if deadline is not None and (isinstance(e, deadlines.DeadlineExceeded) or deadline.expired()):
+            result.status = "timeout"
+            logging.error(f"{src.name} cancelled after exceeding its {budget:.0f}s budget: {e}")
+        else:
+            result.status = "failed"
+            logging.error(f"Error occurred while fetching or processing {src.name} data: {e}")
+        result.error = str(e)
+    finally:
+        deadlines.unbind(deadline_token)
+        metrics.unbind(metrics_token)
+        limiter.release(acquired)
+        result.seconds = time.perf_counter() - started
+    return result
+
+
+def run_sources(ctx, sources=None, max_workers=MAX_WORKERS, host_limits=None, deadline=None, costs=None):
+    # Run every source on a bounded thread pool and gather their tables into a single dict.
+    # With a deadline, each source gets a time budget from its expected cost (costs: {name: seconds},
+    # usually from earlier runs) and anything still running at the deadline is abandoned.
+    # A node starts once every node it depends on has finished; independent nodes run in parallel.
+    # Host slots are taken here before submitting, so a node whose host is busy waits in the queue
+    # without occupying a worker and the next ready node on a free host goes ahead of it.
+    sources = list(SOURCES.values()) if sources is None else list(sources)
+    costs = costs or {}
+    known = {**SOURCES, **{src.name: src for src in sources}}
+    graph = {src.name: resolve(src.depends, known) for src in sources}
+    selected = {src.name for src in sources}
+    limiter = HostLimiter(host_limits)
+    start = time.perf_counter()
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="etl-source")
+    waiting = schedule(sources, costs)
+    running = {}
+    finished = {}
+    ready_since = {}
+
+    def submit_ready():
+        # Submit waiting nodes whose dependencies succeeded and whose hosts have a free slot, in schedule
+        # order and no more than there are workers; skip those whose dependencies didn't succeed
+        changed = True
+        while changed:
+            changed = False
+            for src in list(waiting):
+                upstream = [finished.get(dep) for dep in graph[src.name]]
+                broken = [dep for dep, r in zip(graph[src.name], upstream) if r is not None and r.status != "ok"]
+                missing = [dep for dep in graph[src.name] if dep not in selected]
+                if broken or missing:
+                    finished[src.name] = SourceResult(name=src.name, status="skipped",
+                                                      error=f"upstream not available: {', '.join(broken + missing)}")
+                    waiting.remove(src)
+                    changed = True
+                elif all(r is not None for r in upstream):
+                    queued = ready_since.setdefault(src.name, time.perf_counter())
+                    if len(running) >= max_workers:
+                        continue
+                    acquired = limiter.try_acquire(src.hosts)
+                    if acquired is None:
+                        continue
+                    budget = src.budget(costs.get(src.name)) if deadline is not None else None
+                    running[pool.submit(_run_source, src, ctx, limiter, acquired, queued, budget, deadline)] = src
+                    waiting.remove(src)
+
+    submit_ready()
+    while running:
+        timeout = None if deadline is None else max(0.0, deadline.remaining())
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            result = future.result()
+            finished[running.pop(future).name] = result
+            if result.status == "ok":
+                ctx.outputs.update(result.tables)
+        submit_ready()
+    # Threads can't be killed: sources still running keep going in the background until their
+    # requests time out, but nothing waits for them and their tables are dropped
+    pool.shutdown(wait=not running, cancel_futures=True)
+    for future, src in running.items():
+        if future.cancelled():
+            finished[src.name] = SourceResult(name=src.name, status="skipped", error="deadline reached before it started")
+        else:
+            finished[src.name] = SourceResult(name=src.name, status="timeout", seconds=time.perf_counter() - start,
+                                              error="still running at the deadline")
+    for src in waiting:
+        finished[src.name] = SourceResult(name=src.name, status="skipped", error="deadline reached before it started")
+    wall = time.perf_counter() - start
+    # Keep the tables in registration order regardless of completion order; intermediate outputs aren't loaded
+    results = [finished[src.name] for src in sources]
+    all_data = {}
+    for src, result in zip(sources, results):
+        if src.load:
+            all_data.update(result.tables)
+    log_report(results, wall, graph)
+    return all_data, results
+
+
+def critical_path(results, graph=None):
+    # Longest chain of source times through the dependency graph ({name: [names it depends on]}),
+    # as (seconds, [names from the first node to the last])
+    seconds = {r.name: r.seconds for r in results}
+    graph = graph or {}
+    paths = {}
+    def longest(name):
+        if name not in paths:
+            upstream = [longest(dep) for dep in graph.get(name, ()) if dep in seconds]
+            before = max(upstream, key=lambda p: p[0], default=(0.0, []))
+            paths[name] = (before[0] + seconds[name], before[1] + [name])
+        return paths[name]
+    return max((longest(name) for name in seconds), key=lambda p: p[0])
+
+
+def log_report(results, wall, graph=None):
+    # Total time is the sum of every source; the critical path is the longest chain of dependent sources
+    if not results:
+        return
+    total = sum(r.seconds for r in results)
+    path_seconds, path = critical_path(results, graph)
+    failed = [r.name for r in results if r.status == "failed"]
+    timed_out = [r.name for r in results if r.status == "timeout"]
+    skipped = [f"{r.name} ({r.error})" for r in results if r.status == "skipped"]
+    for r in sorted(results, key=lambda r: r.seconds, reverse=True):
+        logging.info(f"  {r.name}: {r.seconds:.2f}s (waited {r.wait_seconds:.2f}s for host slot)")
+    logging.info(
+        f"Fetched {len(results)} sources in {wall:.2f}s wall time "
+        f"(sequential total {total:.2f}s, critical path {path_seconds:.2f}s via {' -> '.join(path)})."
+    )
+    if failed:
+        logging.warning(f"Sources failed: {', '.join(failed)}")
+    if timed_out:
+        logging.warning(f"Sources cancelled at their time budget: {', '.join(timed_out)}")
+    if skipped:
+        logging.warning(f"Sources skipped: {', '.join(skipped)}")
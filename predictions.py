@@ -1,102 +1,209 @@
-import os
+import json
+import logging
+import numpy as np
 import pandas as pd
-import streamlit as st
-
-from dotenv import load_dotenv
-from fredapi import Fred
-from helper import get_engine, load_table
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error, r2_score
-from sklearn.model_selection import train_test_split
-from sqlalchemy import create_engine
-
-
-# Initialize FRED API
-load_dotenv()
-FRED_API_KEY = os.getenv("FRED_API_KEY")
-fred = Fred(api_key=FRED_API_KEY)
-
-# Read data sources
-tables = ["ism", "monthly_data", "quarterly_data", "financial_conditions"]
-data = {name: load_table(name) for name in tables}
-ism_df = load_table("ism")
-# Add column to ISM df for Orders minus Inventories
-ism_df["Orders - Inventories"] = ism_df["ISM New Orders"] - ism_df["ISM Inventories"]
-
-
-# USD
-usd = data["financial_conditions"][["USD"]].copy()
-usd = usd.resample("ME").mean()
-# WTI Crude
-wti = pd.DataFrame(data=fred.get_series("DCOILWTICO"), columns=["WTI"])
-wti.index.name = "Date"
-wti = wti.resample("ME").mean()
-wti.index = wti.index + pd.offsets.MonthEnd(0)
-# Future Business Activity
-future_business_activity = data["monthly_data"][["Future Business Activity (Texas)"]].copy()
-future_business_activity = future_business_activity.dropna()
-future_business_activity["Future Business Activity (Smoothed)"] = future_business_activity["Future Business Activity (Texas)"].rolling(window=6, center=False).mean()
-# Future New Orders
-future_orders = data["monthly_data"][["Future New Orders (Philadelphia)"]].copy()
-future_orders["Future New Orders (Smoothed)"] = future_orders["Future New Orders (Philadelphia)"].rolling(window=6, center=False).mean()
-# Residential/Domestic Investment
-residential = data["quarterly_data"][["Private Residential Fixed Investment"]].copy()
-domestic = data["quarterly_data"][["Real Gross Private Domestic Investment"]].copy()
-residential["Domestic Investment"] = domestic["Real Gross Private Domestic Investment"]
-residential["Residential % Domestic"] = residential["Private Residential Fixed Investment"] / residential["Domestic Investment"]
-residential = residential.resample('ME').interpolate(method='cubic')
-residential.index = residential.index + pd.offsets.MonthEnd(3)
-# New Orders minus Inventories
-orders_inventories = ism_df[["Orders - Inventories"]].copy().dropna()
-orders_inventories["Orders - Inventories (Smoothed)"] = orders_inventories["Orders - Inventories"].rolling(window=3, center=False).mean()
-# Combine input variables
-inputs = pd.DataFrame()
-inputs["Future New Orders"] = future_orders["Future New Orders (Smoothed)"]
-inputs["Future Business Activity"] = future_business_activity["Future Business Activity (Smoothed)"]
-inputs["Residential % Domestic"] = residential["Residential % Domestic"]
-inputs["USD"] = usd["USD"]
-inputs["WTI"] = wti["WTI"]
-inputs["Orders - Inventories"] = orders_inventories["Orders - Inventories (Smoothed)"]  
-    
-    
-
-# Function to make predictions of ISM 
-def make_predictions(input_df, data_lag, start_date, variables):
-    input_data = input_df.copy()
-    # Adjust the timeline
-    input_data.index = input_data.index + pd.offsets.MonthEnd(data_lag)
-    input_data = input_data[input_data.index > start_date]
-    
-    # Modelling
-    ism = ism_df.copy()
-    ism = ism[ism.index > start_date]
-    ism_y = ism["ISM"]
-    inputs_todate = input_data.loc[ism.index]
-    inputs_todate = inputs_todate[variables]
-    X_train, X_test, y_train, y_test = train_test_split(inputs_todate, ism_y, test_size=0.2, shuffle=False)
-    # Create and fit the model
+
+from catalog import read_catalog
+from loader import KEY, content_hash, write_tables
+from sqlalchemy import text
+
+
+# ISM predictions as a pipeline stage: run_predictions() refits or extends the models only when one of
+# their input tables changed since the last run (by etl_watermarks version). Fitted coefficients are kept
+# in prediction_models; when the training data is unchanged they are reused and only new rows are written.
+MODELS_TABLE = "prediction_models"
+TARGET_TABLE = "ism"
+
+CREATE_MODELS = f"""
+CREATE TABLE IF NOT EXISTS {MODELS_TABLE} (
+    model TEXT PRIMARY KEY,
+    variables JSONB NOT NULL,
+    coefficients JSONB NOT NULL,
+    intercept DOUBLE PRECISION NOT NULL,
+    r2_out_of_sample DOUBLE PRECISION,
+    training_hash TEXT NOT NULL,
+    input_versions JSONB NOT NULL,
+    fitted_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    run_id TEXT
+)
+"""
+
+UPSERT_MODEL = text(f"""
+INSERT INTO {MODELS_TABLE} (model, variables, coefficients, intercept, r2_out_of_sample, training_hash, input_versions, run_id)
+VALUES (:model, CAST(:variables AS JSONB), CAST(:coefficients AS JSONB), :intercept, :r2_out_of_sample, :training_hash,
+        CAST(:input_versions AS JSONB), :run_id)
+ON CONFLICT (model) DO UPDATE SET
+    variables = EXCLUDED.variables,
+    coefficients = EXCLUDED.coefficients,
+    intercept = EXCLUDED.intercept,
+    r2_out_of_sample = COALESCE(EXCLUDED.r2_out_of_sample, {MODELS_TABLE}.r2_out_of_sample),
+    fitted_at = CASE WHEN {MODELS_TABLE}.training_hash = EXCLUDED.training_hash THEN {MODELS_TABLE}.fitted_at ELSE now() END,
+    training_hash = EXCLUDED.training_hash,
+    input_versions = EXCLUDED.input_versions,
+    updated_at = now(),
+    run_id = EXCLUDED.run_id
+""")
+
+# Every model's inputs are lagged by data_lag months and fitted on ISM from start_date
+MODELS = {
+    "model_1": {"data_lag": 6, "start_date": "2000-01-01", "variables": ["Future New Orders", "Residential % Domestic"]},
+    "model_2": {"data_lag": 4, "start_date": "2005-03-01", "variables": ["Orders - Inventories", "Future Business Activity"]},
+}
+
+# Table each input variable is built from (the input frame itself is on monthly_data's dates)
+INPUT_TABLES = {
+    "Future New Orders": "monthly_data",
+    "Future Business Activity": "monthly_data",
+    "Residential % Domestic": "quarterly_data",
+    "USD": "financial_conditions",
+    "WTI": "financial_conditions",
+    "Orders - Inventories": "ism",
+}
+
+
+def model_tables(variables):
+    return sorted({"monthly_data", TARGET_TABLE} | {INPUT_TABLES[v] for v in variables})
+
+
+def build_inputs(data, variables):
+    # Monthly input variables from the stored tables (only the ones asked for)
+    monthly = data["monthly_data"]
+    inputs = pd.DataFrame(index=monthly.index)
+    if "Future New Orders" in variables:
+        inputs["Future New Orders"] = monthly["Future New Orders (Philadelphia)"].rolling(window=6, center=False).mean()
+    if "Future Business Activity" in variables:
+        activity = monthly["Future Business Activity (Texas)"].dropna()
+        inputs["Future Business Activity"] = activity.rolling(window=6, center=False).mean()
+    if "Residential % Domestic" in variables:
+        quarterly = data["quarterly_data"]
+        residential = (quarterly["Private Residential Fixed Investment"] / quarterly["Real Gross Private Domestic Investment"]).to_frame("Residential % Domestic")
+        residential = residential.resample("ME").interpolate(method="cubic")
+        residential.index = residential.index + pd.offsets.MonthEnd(3)
+        inputs["Residential % Domestic"] = residential["Residential % Domestic"]
+    if "USD" in variables:
+        inputs["USD"] = data["financial_conditions"]["USD"].resample("ME").mean()
+    if "WTI" in variables:
+        # Stored daily by the Financial Conditions source
+        inputs["WTI"] = data["financial_conditions"]["WTI Crude"].resample("ME").mean()
+    if "Orders - Inventories" in variables:
+        ism = data[TARGET_TABLE]
+        orders_inventories = (ism["ISM New Orders"] - ism["ISM Inventories"]).dropna()
+        inputs["Orders - Inventories"] = orders_inventories.rolling(window=3, center=False).mean()
+    return inputs
+
+
+def _predict(X, coefficients, intercept):
+    return pd.DataFrame(X.to_numpy() @ np.asarray(coefficients) + intercept, index=X.index, columns=["ISM Predicted"])
+
+
+def _version(entry):
+    # Same version string the app's table cache uses
+    if entry is None:
+        return None
+    return entry.get("content_hash") or entry.get("last_run_id") or str(entry.get("last_date"))
+
+
+def read_models(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql(CREATE_MODELS)
+        rows = conn.execute(text(f"SELECT model, coefficients, intercept, training_hash, input_versions FROM {MODELS_TABLE}"))
+        return {row["model"]: dict(row) for row in rows.mappings()}
+
+
+def fit_model(inputs, ism, data_lag, start_date, variables):
+    # Lags the inputs and fits ISM on them (first 80% of the overlap in time, the rest held out)
+    from sklearn.linear_model import LinearRegression
+    from sklearn.metrics import r2_score
+    from sklearn.model_selection import train_test_split
+    X, y = training_data(inputs, ism, data_lag, start_date, variables)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
     model = LinearRegression(fit_intercept=True)
     model.fit(X_train, y_train)
-    y_pred = model.predict(X_test)
-    print("Out-of-sample R²:", r2_score(y_test, y_pred))
+    r2 = r2_score(y_test, model.predict(X_test))
+    return list(map(float, model.coef_)), float(model.intercept_), float(r2)
+
+
+def lagged(inputs, data_lag, start_date):
+    input_data = inputs.copy()
+    input_data.index = input_data.index + pd.offsets.MonthEnd(data_lag)
+    return input_data[input_data.index > start_date]
 
-    # Full dataset predictions
-    input_data = input_data[variables].dropna()
-    full_pred = model.predict(input_data)
-    prediction_df = pd.DataFrame(data=full_pred, index=input_data.index, columns=["ISM Predicted"])
-    # Return the dataframe of ISM predictions
-    return prediction_df
 
+def training_data(inputs, ism, data_lag, start_date, variables):
+    input_data = lagged(inputs, data_lag, start_date)
+    ism = ism[ism.index > start_date]
+    return input_data.loc[ism.index, variables], ism["ISM"]
 
 
-# Get the prediction dfs for each model
-model_1 = make_predictions(input_df=inputs, data_lag=6, start_date="2000-01-01", variables=["Future New Orders", "Residential % Domestic"])
-model_2 = make_predictions(input_df=inputs, data_lag=4, start_date="2005-03-01", variables=["Orders - Inventories", "Future Business Activity"])
+def run_predictions(engine=None, catalog=None, run_id=None, force=False, models=None):
+    # Updates model_1/model_2 if any of their input tables changed; returns {model: "skipped"/"extended"/"refit"}.
+    # Pass the ETL's engine and catalog to run straight after run_etl in the same process.
+    if engine is None:
+        from db import get_engine
+        engine = get_engine("etl_writer_pw")
+    models = {name: MODELS[name] for name in (models or MODELS)}
+    tables = sorted({t for spec in models.values() for t in model_tables(spec["variables"])})
+    if catalog is None or any(t not in catalog for t in tables + list(models)):
+        catalog = {**read_catalog(engine, tables + list(models)), **(catalog or {})}
+    versions = {t: _version(catalog.get(t)) for t in tables}
+    stored = read_models(engine)
+    due = {name: spec for name, spec in models.items()
+           if force or stored.get(name, {}).get("input_versions") != {t: versions[t] for t in model_tables(spec["variables"])}}
+    status = {name: "skipped" for name in models if name not in due}
+    if not due:
+        logging.info("Prediction inputs unchanged, models not updated.")
+        return status
+    # Each input table is read once for all models
+    needed = sorted({t for spec in due.values() for t in model_tables(spec["variables"])})
+    data = {t: pd.read_sql_table(t, con=engine, index_col=KEY, parse_dates=[KEY]).sort_index() for t in needed}
+    frames = {}
+    records = []
+    for name, spec in due.items():
+        variables = spec["variables"]
+        inputs = build_inputs(data, variables)
+        X, y = training_data(inputs, data[TARGET_TABLE], spec["data_lag"], spec["start_date"], variables)
+        training_hash = content_hash(pd.concat([X, y], axis=1).astype("float64"))
+        previous = stored.get(name)
+        if previous is not None and previous["training_hash"] == training_hash and not force:
+            # Same training data: the stored fit still holds, so only new dates get predictions
+            coefficients, intercept, r2 = previous["coefficients"], previous["intercept"], None
+            status[name] = "extended"
+        else:
+            coefficients, intercept, r2 = fit_model(inputs, data[TARGET_TABLE], spec["data_lag"], spec["start_date"], variables)
+            logging.info(f"Refit {name}: out-of-sample R² {r2:.3f}")
+            status[name] = "refit"
+        prediction = _predict(lagged(inputs, spec["data_lag"], spec["start_date"])[variables].dropna(), coefficients, intercept)
+        prediction.index.name = KEY
+        if status[name] == "refit":
+            # New coefficients change every row, so the whole table is compared
+            prediction.attrs["diff_start"] = prediction.index.min()
+        else:
+            # Rows past the training window have no ISM yet, so revised inputs there change them without
+            # changing the training hash; they are all compared, not just those after the last prediction
+            forecast = prediction.index[prediction.index > y.index.max()]
+            if len(forecast):
+                prediction.attrs["diff_start"] = forecast.min()
+        frames[name] = prediction
+        records.append({
+            "model": name, "variables": json.dumps(variables), "coefficients": json.dumps(coefficients), "intercept": intercept,
+            "r2_out_of_sample": r2, "training_hash": training_hash, "run_id": run_id,
+            "input_versions": json.dumps({t: versions[t] for t in model_tables(variables)}),
+        })
+    write_tables(frames, engine, catalog=catalog, run_id=run_id)
+    with engine.begin() as conn:
+        # A reused fit has no new R², so the stored one is kept
+        conn.execute(UPSERT_MODEL, records)
+    logging.info("Predictions: " + ", ".join(f"{name} {s}" for name, s in status.items()))
+    return status
 
-# Define the SQL engine
-engine = get_engine("etl_writer_pw")
 
-# Create dictionary and save to SQL
-predictions = {"model_1": model_1, "model_2": model_2}
-for table_name, df in predictions.items():
-    df.to_sql(table_name, engine, if_exists='replace', index=True)
\ No newline at end of file
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Update the ISM prediction models if their inputs changed.")
+    parser.add_argument("--force", action="store_true", help="Refit every model even if nothing changed.")
+    args = parser.parse_args()
+    run_predictions(force=args.force)
@@ -0,0 +1,86 @@
+import deadlines
+import metrics
+import numpy as np
+import pandas as pd
+import requests
+import xml.etree.ElementTree as ET
+
+
+# Shared ingestion for SDMX sources (BIS SDMX-ML, IMF SDMX-JSON), emitting series indexed by period end
+
+
+def period_end(periods, freq="Q"):
+    # "2024-Q3" / "2024-09" / "2024" style periods -> normalized period-end timestamps
+    return pd.PeriodIndex(periods, freq=freq).to_timestamp(how="end").normalize()
+
+
+def _local(tag):
+    # Strip the {namespace} prefix ElementTree puts on tags
+    return tag.rsplit("}", 1)[-1]
+
+
+def read_sdmx_xml(source, freq="Q", name=None, time_attr="TIME_PERIOD", value_attr="OBS_VALUE", capacity=1024):
+    # Stream-parses an SDMX-ML (structure-specific) message from a path or file-like object.
+    # Observations go straight into preallocated arrays and every element is cleared once read,
+    # so memory stays flat however large the dataflow is.
+    periods = np.empty(capacity, dtype=object)
+    values = np.empty(capacity, dtype="float64")
+    count = 0
+    for _, elem in ET.iterparse(source, events=("end",)):
+        tag = _local(elem.tag)
+        if tag == "Obs":
+            value = elem.attrib.get(value_attr)
+            if value is not None and value not in ("", "NaN"):
+                if count == len(values):
+                    # Double the buffers when full
+                    periods = np.concatenate([periods, np.empty(len(periods), dtype=object)])
+                    values = np.concatenate([values, np.empty(len(values), dtype="float64")])
+                periods[count] = elem.attrib.get(time_attr)
+                values[count] = float(value)
+                count += 1
+            elem.clear()
+        elif tag == "Series":
+            elem.clear()
+    series = pd.Series(values[:count], index=period_end(periods[:count], freq), name=name)
+    series.index.name = "Date"
+    return series
+
+
+def read_sdmx_json(payload, freq="Q", name=None, series_key=None):
+    # Decodes an SDMX-JSON data message (already json-loaded). Observation keys index into the
+    # observation dimension's values, so dates and values are looked up in bulk rather than per quarter.
+    data = payload["data"]
+    all_series = data["dataSets"][0]["series"]
+    key = series_key if series_key is not None else next(iter(all_series))
+    observations = all_series[key]["observations"]
+    time_values = data["structures"][0]["dimensions"]["observation"][0]["values"]
+    time_periods = np.array([v.get("value", v.get("id")) for v in time_values], dtype=object)
+    positions = np.fromiter((int(k) for k in observations), dtype=np.int64, count=len(observations))
+    raw = pd.Series([obs[0] for obs in observations.values()], dtype=object)
+    series = pd.Series(pd.to_numeric(raw, errors="coerce").to_numpy(dtype="float64"),
+                       index=period_end(time_periods[positions], freq), name=name)
+    series.index.name = "Date"
+    return series.sort_index()
+
+
+def fetch_sdmx_xml(url, freq="Q", name=None, session=None, timeout=None):
+    # Streams an SDMX-ML response straight into read_sdmx_xml without buffering the whole body
+    session = session or requests
+    # Download and parse overlap while streaming, so the whole read counts as download time
+    with metrics.timed("download"), session.get(url, stream=True, timeout=deadlines.timeout(timeout)) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        series = read_sdmx_xml(response.raw, freq=freq, name=name)
+        metrics.count("requests")
+        metrics.count("bytes", response.raw.tell())
+        return series
+
+
+def fetch_sdmx_json(url, freq="Q", name=None, series_key=None, session=None, timeout=None):
+    session = session or requests
+    with metrics.timed("download"):
+        response = session.get(url, timeout=deadlines.timeout(timeout))
+    metrics.record_response(response)
+    response.raise_for_status()
+    with metrics.timed("parse"):
+        return read_sdmx_json(response.json(), freq=freq, name=name, series_key=series_key)
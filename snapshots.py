@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+
+from datetime import datetime, timezone
+from frame_files import read_frame, write_frame
+from loader import content_hash
+
+
+# Each run's frames are written as compressed Parquet under data/snapshots/<run_id>/ with a
+# manifest.json, so a run can be reloaded for diffing or replay without Postgres or the network
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.getenv("ETL_SNAPSHOT_DIR", os.path.join(BASE_DIR, "data", "snapshots"))
+MANIFEST = "manifest.json"
+
+
+def _date_range(df):
+    # First and last index values as strings; None when the index is empty or not orderable
+    try:
+        return [str(df.index.min()), str(df.index.max())] if len(df) else None
+    except TypeError:
+        return None
+
+
+def write_snapshot(all_data, run_id, snapshot_dir=SNAPSHOT_DIR):
+    # Writes every frame in all_data plus a manifest of schema, row counts and hashes; returns the run directory
+    run_dir = os.path.join(snapshot_dir, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    tables = {}
+    for table_name, df in all_data.items():
+        tables[table_name] = {
+            "file": write_frame(df, os.path.join(run_dir, table_name), compression="zstd"),
+            "rows": len(df),
+            "index": {"name": df.index.name, "dtype": str(df.index.dtype)},
+            "columns": {str(c): str(t) for c, t in df.dtypes.items()},
+            "date_range": _date_range(df),
+            "content_hash": content_hash(df),
+        }
+    manifest = {"run_id": run_id, "created_at": datetime.now(timezone.utc).isoformat(), "tables": tables}
+    with open(os.path.join(run_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    logging.info(f"Snapshot of {len(tables)} tables saved to {run_dir}.")
+    return run_dir
+
+
+def list_snapshots(snapshot_dir=SNAPSHOT_DIR):
+    # Run ids with a manifest, oldest first (run ids sort by time)
+    if not os.path.isdir(snapshot_dir):
+        return []
+    return sorted(d for d in os.listdir(snapshot_dir) if os.path.exists(os.path.join(snapshot_dir, d, MANIFEST)))
+
+
+def read_manifest(run_id=None, snapshot_dir=SNAPSHOT_DIR):
+    # The manifest of run_id, or of the latest snapshot when run_id is None
+    if run_id is None:
+        runs = list_snapshots(snapshot_dir)
+        if not runs:
+            raise FileNotFoundError(f"No snapshots in {snapshot_dir}")
+        run_id = runs[-1]
+    with open(os.path.join(snapshot_dir, run_id, MANIFEST)) as f:
+        return json.load(f)
+
+
+def load_snapshot(run_id=None, tables=None, snapshot_dir=SNAPSHOT_DIR):
+    # Reloads {table_name: DataFrame} from a snapshot (latest by default), optionally just some tables
+    manifest = read_manifest(run_id, snapshot_dir)
+    run_dir = os.path.join(snapshot_dir, manifest["run_id"])
+    all_data = {}
+    for table_name, entry in manifest["tables"].items():
+        if tables is not None and table_name not in tables:
+            continue
+        all_data[table_name] = read_frame(os.path.join(run_dir, entry["file"]))
+    return all_data
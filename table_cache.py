@@ -0,0 +1,120 @@
+import logging
+import pandas as pd
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class TableCache:
+    # Process-wide cache of table frames keyed by name and data version (the table's etl_watermarks hash).
+    # Versions come from one cheap catalog query, repeated at most every poll_seconds (or straight away
+    # after invalidate()). A stale frame is served while a background reload runs, and concurrent
+    # misses for the same table share a single query. Tables with no version are reloaded after ttl seconds.
+    # get() can take keyword arguments (hashable values) that are passed on to load(table_name, **query);
+    # each distinct query of a table is its own entry, all of them following the table's version.
+    def __init__(self, load, read_versions, poll_seconds=5.0, ttl=300.0, workers=2):
+        self._load = load
+        self._read_versions = read_versions
+        self.poll_seconds = poll_seconds
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._inflight = {}
+        self._versions = {}
+        self._polled = None
+        self._known = None
+        self._poll_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="table-cache")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def versions(self):
+        # {table: version}; one thread polls at a time while the others use the last known versions
+        # (until the first poll has finished, they wait for it instead)
+        if not self._due():
+            return dict(self._versions)
+        if not self._poll_lock.acquire(blocking=self._known is None):
+            return dict(self._versions)
+        try:
+            if not self._due():
+                return dict(self._versions)
+            versions = None
+            try:
+                versions = self._read_versions()
+            except Exception as e:
+                logging.warning(f"Could not read table versions, serving cached data: {e}")
+            with self._lock:
+                if versions is not None:
+                    self._versions = versions
+                self._known = self._polled = time.monotonic()
+                return dict(self._versions)
+        finally:
+            self._poll_lock.release()
+
+    def _due(self):
+        with self._lock:
+            return self._polled is None or time.monotonic() - self._polled >= self.poll_seconds
+
+    def invalidate(self, table_name=None):
+        # Forces the next read to re-poll versions; with a name, also drops that table's entry
+        with self._lock:
+            self._polled = None
+            if table_name is not None:
+                for key in [k for k in self._entries if k[0] == table_name]:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._polled = None
+
+    def _fresh(self, entry, version):
+        if version is not None:
+            return entry[0] == version
+        return entry[0] is None and time.monotonic() - entry[2] < self.ttl
+
+    def _reload(self, key, version, future):
+        table_name, query = key
+        try:
+            df = self._load(table_name, **dict(query))
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._entries[key] = (version, df, time.monotonic())
+            self._inflight.pop(key, None)
+        future.set_result(df)
+
+    def _copy(self, df):
+        # With pandas copy-on-write on, a shallow copy is enough: writes to it copy the touched columns
+        return df.copy(deep=not pd.options.mode.copy_on_write)
+
+    def get(self, table_name, **query):
+        # Returns a copy so callers can add columns or resample without touching the cached frame
+        version = self.versions().get(table_name)
+        key = (table_name, tuple(sorted(query.items())))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry, version):
+                self.hits += 1
+                return self._copy(entry[1])
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            if entry is not None:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+        if entry is not None:
+            # Stale: serve what we have and reload in the background
+            if owner:
+                self._pool.submit(self._reload, key, version, future)
+            return self._copy(entry[1])
+        if owner:
+            self._reload(key, version, future)
+        return self._copy(future.result())
@@ -0,0 +1,52 @@
+import contextlib
+import os
+import pandas as pd
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import derived
+
+
+class FakeEngine:
+    def connect(self):
+        return contextlib.nullcontext()
+
+
+def run(monkeypatch, catalog, load_stats):
+    # Runs update_derived for global_m2_yoy with the database reads and writes replaced
+    index = pd.date_range("2020-01-03", periods=120, freq="W-FRI", name="Date")
+    stored = pd.DataFrame({"Global M2": range(100, 220)}, index=index, dtype="float64")
+    reads, written = [], {}
+    def read_input(table_name, conn, start):
+        reads.append((table_name, start))
+        return stored if start is None else stored[stored.index >= start]
+    def write_tables(frames, engine, **kwargs):
+        written.update(frames)
+        return {name: {"rows": len(df)} for name, df in frames.items()}
+    monkeypatch.setattr(derived, "_read_input", read_input)
+    monkeypatch.setattr(derived, "write_tables", write_tables)
+    derived.update_derived(FakeEngine(), catalog, load_stats, tables=["global_m2_yoy"])
+    return reads, written
+
+
+def test_missing_table_built_when_inputs_unchanged(monkeypatch):
+    # First incremental run after the derived table was added: global_m2 wasn't rewritten
+    reads, written = run(monkeypatch, {"global_m2": {"content_hash": "a"}}, {"global_m2": {"changed_from": None}})
+    assert reads == [("global_m2", None)]
+    assert len(written["global_m2_yoy"]) == 120
+    assert "diff_start" not in written["global_m2_yoy"].attrs
+
+
+def test_stored_table_skipped_when_inputs_unchanged(monkeypatch):
+    catalog = {"global_m2": {"content_hash": "a"}, "global_m2_yoy": {"content_hash": "b"}}
+    reads, written = run(monkeypatch, catalog, {})
+    assert reads == [] and written == {}
+
+
+def test_stored_table_recomputed_from_change(monkeypatch):
+    catalog = {"global_m2": {"content_hash": "a"}, "global_m2_yoy": {"content_hash": "b"}}
+    changed_from = pd.Timestamp("2022-01-07")
+    reads, written = run(monkeypatch, catalog, {"global_m2": {"changed_from": changed_from}})
+    assert reads == [("global_m2", changed_from - pd.DateOffset(weeks=60))]
+    assert written["global_m2_yoy"].index.min() == changed_from
+    assert written["global_m2_yoy"].attrs["diff_start"] == changed_from
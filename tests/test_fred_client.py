@@ -0,0 +1,147 @@
+import importlib
+import json
+import os
+import pandas as pd
+import pytest
+import requests
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import deadlines
+import fred_client
+
+# Observations served per series id (anything else gets A's)
+OBSERVATIONS = {
+    "A": [("2024-01-01", "1.0"), ("2024-02-01", "2.0"), ("2024-03-01", ".")],
+    "B": [("2024-02-01", "20.0"), ("2024-03-01", "30.0"), ("2024-04-01", "40.0")],
+}
+
+
+class FredStandIn(BaseHTTPRequestHandler):
+    # failures: {series id: statuses answered (in order) before serving it}; down: series ids that always get 503
+    requests = []
+    failures = {}
+    down = set()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.requests.append((url.path, params))
+        series_id = params.get("series_id")
+        pending = self.failures.get(series_id)
+        if pending or series_id in self.down:
+            self.send_response(pending.pop(0) if pending else 503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        observations = [{"date": d, "value": v} for d, v in OBSERVATIONS.get(series_id, OBSERVATIONS["A"])]
+        body = json.dumps({"observations": observations}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fred(monkeypatch):
+    # A FredClient using FRED_API_URL pointed at a local stand-in server
+    FredStandIn.requests = []
+    FredStandIn.failures = {}
+    FredStandIn.down = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FredStandIn)
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True).start()
+    monkeypatch.setenv("FRED_API_URL", f"http://127.0.0.1:{server.server_port}/fred")
+    module = importlib.reload(fred_client)
+    client = module.FredClient(api_key="test", requests_per_minute=60_000, backoff=0.01)
+    yield client
+    client.close()
+    server.shutdown()
+    monkeypatch.delenv("FRED_API_URL")
+    importlib.reload(fred_client)
+
+
+def test_get_series(fred):
+    series = fred.get_series("A")
+    assert series.name == "A"
+    assert list(series.index) == list(pd.to_datetime(["2024-01-01", "2024-02-01", "2024-03-01"]))
+    assert series.iloc[:2].tolist() == [1.0, 2.0] and pd.isna(series.iloc[2])
+    path, params = FredStandIn.requests[0]
+    assert path == "/fred/series/observations"
+    assert params["api_key"] == "test" and params["file_type"] == "json"
+
+
+def test_get_many_left_alignment(fred):
+    df = fred.get_many({"First": "A", "Second": "B"})
+    assert list(df.columns) == ["First", "Second"]
+    assert list(df.index) == list(pd.to_datetime(["2024-01-01", "2024-02-01", "2024-03-01"]))
+    assert df.index.name == "Date"
+    assert pd.isna(df.loc["2024-01-01", "Second"]) and df.loc["2024-03-01", "Second"] == 30.0
+
+
+def test_get_many_outer_alignment(fred):
+    df = fred.get_many(["A", "B"], how="outer")
+    assert list(df.index) == list(pd.to_datetime(["2024-01-01", "2024-02-01", "2024-03-01", "2024-04-01"]))
+    assert df.loc["2024-04-01", "B"] == 40.0 and pd.isna(df.loc["2024-04-01", "A"])
+
+
+def test_observation_start_forwarded(fred):
+    fred.get_many(["A", "B"], observation_start=pd.Timestamp("2023-10-02"))
+    assert len(FredStandIn.requests) == 2
+    assert all(params["observation_start"] == "2023-10-02" for _, params in FredStandIn.requests)
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retries_then_succeeds(fred, status):
+    FredStandIn.failures["A"] = [status, status]
+    series = fred.get_series("A")
+    assert series.iloc[0] == 1.0
+    assert len(FredStandIn.requests) == 3
+
+
+def test_retries_up_to_max_retries(fred):
+    FredStandIn.down.add("DOWN")
+    fred.max_retries = 2
+    with pytest.raises(requests.HTTPError):
+        fred.get_series("DOWN")
+    assert len(FredStandIn.requests) == 3
+
+
+def test_client_error_not_retried(fred):
+    FredStandIn.failures["A"] = [400, 400]
+    with pytest.raises(requests.HTTPError):
+        fred.get_series("A")
+    assert len(FredStandIn.requests) == 1
+
+
+def test_stops_at_bound_deadline(fred):
+    # The backoff after the first failure would outlast the deadline, so no second attempt is made
+    FredStandIn.down.add("DOWN")
+    fred.backoff = 5.0
+    token = deadlines.bind(deadlines.Deadline(seconds=1.0))
+    started = time.monotonic()
+    try:
+        with pytest.raises(deadlines.DeadlineExceeded):
+            fred.get_series("DOWN")
+    finally:
+        deadlines.unbind(token)
+    assert time.monotonic() - started < 1.0
+    assert len(FredStandIn.requests) == 1
+
+
+def test_expired_deadline_makes_no_request(fred):
+    token = deadlines.bind(deadlines.Deadline(seconds=0))
+    try:
+        with pytest.raises(deadlines.DeadlineExceeded):
+            fred.get_series("A")
+    finally:
+        deadlines.unbind(token)
+    assert FredStandIn.requests == []
@@ -0,0 +1,54 @@
+import numpy as np
+import os
+import pandas as pd
+import sys
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from transforms import splice
+
+
+def iterrows_splice(gold_spot, gld):
+    # The gold extension loop splice replaced, as it ran in fetch_data.py
+    gld = gld.copy()
+    with warnings.catch_warnings():
+        # pct_change()'s default forward fill is deprecated in pandas 2.x but is what the loop relied on
+        warnings.simplefilter("ignore", FutureWarning)
+        gld["Weekly Return"] = gld["GLD"].pct_change(fill_method="pad")
+    last_spot_price = gold_spot["Gold Price"].iloc[-1]
+    extended_gold = gold_spot.copy()
+    for date, row in gld.loc[gold_spot.index[-1]:].iterrows():
+        if date in extended_gold.index:
+            continue
+        weekly_return = row["Weekly Return"]
+        last_spot_price = last_spot_price * (1 + weekly_return)
+        extended_gold.loc[date] = last_spot_price
+    return extended_gold.sort_index()
+
+
+def weekly_frames():
+    # Weekly spot prices with missing weeks (NaN after resampling) ending before GLD does, and GLD
+    # with missing weeks of its own both before and after the spot series ends
+    rng = np.random.default_rng(1)
+    spot_index = pd.date_range("2004-01-04", "2020-06-28", freq="W", name="Date")
+    spot = pd.DataFrame({"Gold Price": 400 * np.exp(np.cumsum(rng.normal(0, 0.02, len(spot_index))))}, index=spot_index)
+    spot.iloc[[10, 11, 300, 700]] = np.nan
+    gld_index = pd.date_range("2004-11-21", "2024-12-29", freq="W", name="Date")
+    gld = pd.DataFrame({"GLD": 40 * np.exp(np.cumsum(rng.normal(0, 0.02, len(gld_index))))}, index=gld_index)
+    gld.loc[["2010-05-02", "2020-09-06", "2020-09-13", "2023-01-01"], "GLD"] = np.nan
+    return spot, gld
+
+
+def test_splice_matches_iterrows_loop():
+    spot, gld = weekly_frames()
+    expected = iterrows_splice(spot, gld)["Gold Price"]
+    result = splice(spot["Gold Price"], gld["GLD"])
+    pd.testing.assert_index_equal(result.index, expected.index)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(dtype="float64"), rtol=1e-12, equal_nan=True)
+
+
+def test_splice_keeps_base_when_proxy_ends_first():
+    spot, gld = weekly_frames()
+    gld = gld[gld.index < "2019-01-01"]
+    result = splice(spot["Gold Price"], gld["GLD"])
+    pd.testing.assert_series_equal(result, iterrows_splice(spot, gld)["Gold Price"], check_freq=False)
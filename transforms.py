@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+
+def splice(base, proxy):
+    # Carries base forward past its last observation using the compounded returns of a
+    # tradable proxy (e.g. gold spot extended with GLD). Both are Series on the same frequency;
+    # the result is base followed by base's last value grown by the proxy's later returns.
+    base = base.sort_index()
+    # A missing proxy value holds its last price (a 0% return), as pct_change's old default fill did
+    returns = proxy.sort_index().ffill().pct_change(fill_method=None)
+    last_date = base.index[-1]
+    # Compound every proxy return after the base ends in one pass
+    growth = (1 + returns[returns.index > last_date]).cumprod(skipna=False)
+    extension = growth * base.iloc[-1]
+    extension.name = base.name
+    spliced = pd.concat([base, extension])
+    spliced.index.name = base.index.name
+    return spliced
+
+
+def lttb(series, max_points):
+    # Largest-triangle-three-buckets downsampling: keeps the first and last points and, from each of
+    # max_points - 2 equal buckets in between, the point forming the largest triangle with the point kept
+    # before it and the average of the next bucket. Peaks and troughs survive, so the line looks the same.
+    # Series with max_points or fewer values come back unchanged; otherwise missing values are dropped first.
+    if max_points is None or max_points < 3 or series.count() <= max_points:
+        return series
+    series = series.dropna()
+    n = len(series)
+    # Seconds since the first point (as floats, so the area products don't overflow)
+    x = (pd.DatetimeIndex(series.index).asi8 - pd.DatetimeIndex(series.index).asi8[0]) / 1e9
+    y = series.to_numpy(dtype="float64")
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    keep = np.empty(max_points, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return series.iloc[keep]
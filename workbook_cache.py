@@ -0,0 +1,79 @@
+import hashlib
+import json
+import logging
+import os
+import pandas as pd
+import threading
+
+from frame_files import read_frame, write_frame
+from http_cache import CACHE_DIR
+
+
+# Sidecar Parquet copies of the sheets in a local workbook. A sheet is parsed through openpyxl only
+# the first time it is asked for after the workbook changes; every other read comes from the sidecar.
+_lock = threading.Lock()
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _sheet_stem(cache_dir, stem, sheet):
+    safe = "".join(c if c.isalnum() else "_" for c in sheet)
+    return os.path.join(cache_dir, f"{stem}.{safe}")
+
+
+def _signature(path, manifest):
+    # mtime/size are checked first; the hash is only computed when they change, so touching
+    # the file without editing it doesn't force a rebuild
+    stat = os.stat(path)
+    if manifest.get("mtime") == stat.st_mtime_ns and manifest.get("size") == stat.st_size:
+        return manifest["sha256"]
+    return _file_hash(path)
+
+
+def read_sheets(path, sheets, cache_dir=CACHE_DIR):
+    # Returns {sheet name: DataFrame} for just the requested sheets of the workbook at path
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    manifest_path = os.path.join(cache_dir, f"{stem}.manifest.json")
+    with _lock:
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        sha256 = _signature(path, manifest)
+        if manifest.get("sha256") != sha256:
+            # Workbook contents changed: every cached sheet is stale
+            manifest = {"sha256": sha256, "sheets": {}}
+        stat = os.stat(path)
+        manifest.update({"mtime": stat.st_mtime_ns, "size": stat.st_size})
+
+        frames = {}
+        stale = []
+        for sheet in sheets:
+            name = manifest["sheets"].get(sheet)
+            if name and os.path.exists(os.path.join(cache_dir, name)):
+                frames[sheet] = read_frame(os.path.join(cache_dir, name))
+            else:
+                stale.append(sheet)
+        if stale:
+            logging.info(f"Rebuilding columnar cache for {os.path.basename(path)}: {', '.join(stale)}")
+            parsed = pd.read_excel(path, sheet_name=stale)
+            for sheet, df in parsed.items():
+                manifest["sheets"][sheet] = write_frame(df, _sheet_stem(cache_dir, stem, sheet))
+                frames[sheet] = df
+        tmp = f"{manifest_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, manifest_path)
+    return {sheet: frames[sheet] for sheet in sheets}
+
+
+def read_sheet(path, sheet, cache_dir=CACHE_DIR):
+    return read_sheets(path, [sheet], cache_dir=cache_dir)[sheet]